@@ -4,12 +4,22 @@ from PIL import Image
 import time
 import re
 import pandas as pd
-import prawcore
 import matplotlib.pyplot as plt
 from auth import authenticate_reddit, register_user, login_user, logout_user, save_user_history
-from distilbert import load_distilbert
-from getcomments import load_sentence_transformer, fetch_and_analyze_sentiment, PREDEFINED_ASPECTS
-from report import get_colour, plot_aspect_radar_chart, map_sentiment_to_label, display_sentiment_distribution,display_aspect_contribution_to_sentiment, TECH_CATEGORIES
+from inference import get_inference_service
+from getcomments import fetch_and_analyze_sentiment, fetch_and_analyze_adaptive, subreddit_exists, PREDEFINED_ASPECTS
+from results import to_dense_frame, export_file, EXPORT_FORMATS
+from trends import get_trend_store
+from deepcrawl import DeepCrawler
+from ratelimit import get_scheduler
+from report import get_colour, plot_aspect_radar_chart, map_sentiment_to_label, display_sentiment_distribution,display_aspect_contribution_to_sentiment, display_confidence_intervals, display_crawl_coverage, TECH_CATEGORIES
+
+def inference_settings():
+    """Optional `[inference]` secrets, e.g. `cascade_threshold = 0.7` to enable the lexicon cascade
+    and `embedding_aspects = true` to enable embedding aspect detection."""
+    config = dict(st.secrets["inference"]) if "inference" in st.secrets else {}
+    return {"cascade_threshold": config.get("cascade_threshold"),
+            "embedding_aspects": bool(config.get("embedding_aspects", False))}
 
 def main():
     if 'user' not in st.session_state:
@@ -161,6 +171,20 @@ def main():
         subreddit = st.text_input("📌 Enter subreddit (leave blank for all):").strip()
         sorting_options = ["new", "hot", "top", "most relevant"]
         sorting = st.selectbox("Sort posts by:", sorting_options)
+        adaptive = st.checkbox("⏱️ Stop early once the average sentiment estimate is precise enough")
+        if adaptive:
+            col_precision, col_budget = st.columns(2)
+            with col_precision:
+                precision = st.number_input("Target precision (± score)", min_value=0.005, max_value=0.2, value=0.02, step=0.005, format="%.3f")
+            with col_budget:
+                max_minutes = st.number_input("Time limit (minutes)", min_value=0.5, max_value=30.0, value=5.0, step=0.5)
+        deep_crawl = st.checkbox("🌳 Deep crawl reply threads (slower, reaches nested discussions)")
+        if deep_crawl:
+            col_calls, col_seconds = st.columns(2)
+            with col_calls:
+                crawl_calls = st.number_input("API call budget", min_value=10, max_value=1000, value=200, step=10)
+            with col_seconds:
+                crawl_minutes = st.number_input("Crawl time limit (minutes)", min_value=0.5, max_value=15.0, value=2.0, step=0.5)
 
         # Run button
         if st.button("Run Analysis"):
@@ -180,51 +204,76 @@ def main():
                     return
             reddit = st.session_state['reddit'] # Assign the authenticated instance to the local 'reddit' variable
 
-            # Subreddit validation
+            # Subreddit validation (answers are cached and shared across sessions)
             if subreddit:
                 try:
-                    reddit = st.session_state['reddit'] # Use the authenticated instance
-                    if not reddit:
-                        st.error("Reddit connection failed.")
-                        return
-                    reddit.subreddits.search_by_name(subreddit, exact=True)
-                except prawcore.exceptions.NotFound:
-                    st.error(f"❌ Subreddit '{subreddit}' does not exist.")
-                    return
+                    exists = subreddit_exists(reddit, subreddit)
                 except Exception as e:
                     st.error(f"An error occurred while checking the subreddit: {e}")
                     return
-                else:
-                    subreddit = subreddit  # Keep the valid subreddit
+                if not exists:
+                    st.error(f"❌ Subreddit '{subreddit}' does not exist.")
+                    return
             else:
                 subreddit = None  # Accept blank input
 
-            # Load models if not already loaded
+            # Load models if not already loaded (shared by all sessions through the inference service)
             if st.session_state.get('tokenizer') is None or st.session_state.get('model') is None or st.session_state.get('embedding_model') is None:
                 with st.spinner("Loading models..."):
                     try:
-                        st.session_state['tokenizer'], st.session_state['model'] = load_distilbert()
-                        st.session_state['embedding_model'] = load_sentence_transformer()
+                        service = get_inference_service(**inference_settings())
+                        st.session_state['tokenizer'], st.session_state['model'] = service.tokenizer, service.model
+                        st.session_state['embedding_model'] = service.embedding_model
                         #st.success("✅ Models loaded successfully!")
                     except Exception as e:
                         st.error(f"❌ Failed to load models: {e}")
                         return
 
             # Fetch and analyze with spinner
+            service = get_inference_service(**inference_settings())
+            crawler = DeepCrawler(get_scheduler(), max_api_calls=crawl_calls, max_seconds=crawl_minutes * 60) if deep_crawl else None
             with st.spinner(text=f"Gathering and analysing Reddit comments for '{keyword}' (sorted by {sorting})... This may take a few minutes."):
-                df_comments = fetch_and_analyze_sentiment(
-                    reddit,
-                    st.session_state['tokenizer'],
-                    st.session_state['model'],
-                    st.session_state['embedding_model'],
-                    keyword=keyword,
-                    subreddit=subreddit,
-                    sorting=sorting
-                )
+                if adaptive:
+                    df_comments = fetch_and_analyze_adaptive(
+                        reddit,
+                        st.session_state['tokenizer'],
+                        st.session_state['model'],
+                        st.session_state['embedding_model'],
+                        keyword=keyword,
+                        subreddit=subreddit,
+                        sorting=sorting,
+                        scorer=service.score,
+                        aspect_classifier=service.aspect_classifier,
+                        precision=precision,
+                        max_seconds=max_minutes * 60,
+                        crawler=crawler
+                    )
+                else:
+                    df_comments = fetch_and_analyze_sentiment(
+                        reddit,
+                        st.session_state['tokenizer'],
+                        st.session_state['model'],
+                        st.session_state['embedding_model'],
+                        keyword=keyword,
+                        subreddit=subreddit,
+                        sorting=sorting,
+                        scorer=service.score,
+                        aspect_classifier=service.aspect_classifier,
+                        crawler=crawler
+                    )
 
                 if not df_comments.empty:
                     st.session_state['df_comments'] = df_comments
+                    st.session_state['history_saved'] = False
+                    try:
+                        get_trend_store().add_frame(keyword, df_comments)
+                    except Exception as e:
+                        print(f"Error updating sentiment trends: {e}")
                     st.success("Analysis complete! Scroll down to see the results.") # Provide feedback
+                    if not df_comments.attrs.get("complete", True):
+                        st.warning("⚠️ Reddit stopped responding part-way through (rate limited or unavailable). Results are based on the comments fetched before that point.")
+                    if service.aspect_classifier is not None:
+                        st.caption(f"Embedding aspect detection added {df_comments.attrs.get('embedding_aspects_added', 0)} aspect mentions not found by keywords.")
                 else:
                     st.warning("⚠️ No comments found for the given keyword and subreddit.")
         else:
@@ -237,7 +286,22 @@ def main():
             # Display the resulting DataFrame
             st.subheader("Filtered and analyzed Reddit comments")
             with st.expander("🔍 View Filtered Comments Breakdown"):
-                st.dataframe(st.session_state['df_comments'])
+                st.dataframe(to_dense_frame(st.session_state['df_comments']))
+
+            # Export straight from Arrow. The file is only written when the button is clicked, outside the
+            # page run, to a temporary file rather than into session state
+            export_col1, export_col2 = st.columns([1, 2])
+            with export_col1:
+                export_format = st.selectbox("Export format:", list(EXPORT_FORMATS.keys()))
+            with export_col2:
+                extension, mime = EXPORT_FORMATS[export_format]
+                df_export = st.session_state['df_comments']
+                st.download_button(
+                    f"⬇️ Download {export_format}",
+                    data=lambda: export_file(df_export, export_format),
+                    file_name=f"{keyword or 'analysis'}_sentiment.{extension}",
+                    mime=mime
+                )
 
             #CSS for containers
             st.markdown("""
@@ -269,6 +333,9 @@ def main():
                     </div>
                 """, unsafe_allow_html=True)
 
+            display_confidence_intervals(st.session_state['df_comments'])
+            display_crawl_coverage(st.session_state['df_comments'])
+
             st.divider()
             col3, col4 = st.columns(2)
             with col3:
@@ -285,8 +352,10 @@ def main():
             st.markdown("""
             Aspect Sentiment Radar: This chart visualizes the average sentiment (0.0-1.0) for key aspects (e.g., Features, Performance) discussed on reddit for the analysed product. Points further from the center indicate more positive sentiment towards that aspect, with line color providing a qualitative sentiment indication (see legend).
             """)
-            # Save history (remains the same)
-            if st.session_state['user']:
+            # Save history once per analysis, not again on every widget interaction
+            if not st.session_state['user']:
+                st.info("Please log in to save your analysis history.")
+            elif not st.session_state.get('history_saved'):
                 success, error = save_user_history(
                     st.session_state['user'],
                     st.session_state['df_comments'],
@@ -295,11 +364,10 @@ def main():
                     subreddit
                 )
                 if success:
+                    st.session_state['history_saved'] = True
                     st.success("Analysis results saved to your history.")
                 else:
                     st.error(f"Error saving history: {error}")
-            else:
-                st.info("Please log in to save your analysis history.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
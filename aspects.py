@@ -0,0 +1,53 @@
+import numpy as np
+
+from distilbert import PREDEFINED_ASPECTS
+
+ASPECT_SIMILARITY_THRESHOLD = 0.5  # Cosine similarity to an aspect's closest keyword needed to count as a mention
+ASPECT_MARGIN = 0.1  # Lead over the next-best aspect needed, so generic comments close to every aspect match none
+ASPECT_TOP_K = 1  # At most this many aspects per text
+
+
+def normalise_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class AspectClassifier:
+    """Detects aspects from sentence embeddings by similarity to the embedded aspect keywords.
+
+    All keyword embeddings are computed once and stacked into one prototype matrix, grouped
+    by aspect. Classifying texts is then a single matrix multiply against embeddings the
+    pipeline already has, followed by a max over each aspect's keywords.
+
+    The threshold has not been validated on labelled data, so detection is conservative: only
+    the `top_k` best aspects of a text are considered, and each must clear the threshold and
+    beat the next-best aspect by `margin`.
+    """
+
+    def __init__(self, embedding_model, aspects=PREDEFINED_ASPECTS, threshold=ASPECT_SIMILARITY_THRESHOLD,
+                 margin=ASPECT_MARGIN, top_k=ASPECT_TOP_K):
+        self.aspects = list(aspects)
+        self.threshold = threshold
+        self.margin = margin
+        self.top_k = top_k
+        keywords = [keyword for aspect in self.aspects for keyword in aspects[aspect]]
+        self.group_starts = np.cumsum([0] + [len(aspects[aspect]) for aspect in self.aspects[:-1]])
+        self.prototypes = normalise_rows(embedding_model.encode(keywords))
+
+    def similarities(self, embeddings):
+        """Returns an (n_texts, n_aspects) matrix of each text's best similarity to each aspect's keywords."""
+        embeddings = normalise_rows(np.atleast_2d(embeddings))
+        keyword_similarities = embeddings @ self.prototypes.T
+        return np.maximum.reduceat(keyword_similarities, self.group_starts, axis=1)
+
+    def detect(self, embeddings):
+        """Returns, for each embedding, the list of aspects among its top_k that clear the threshold and margin."""
+        similarities = self.similarities(embeddings)
+        order = np.argsort(-similarities, axis=1)
+        ranked = np.take_along_axis(similarities, order, axis=1)
+        # Lead of each ranked aspect over the one after it (the last has nothing to beat)
+        leads = np.concatenate([ranked[:, :-1] - ranked[:, 1:], np.full((len(ranked), 1), np.inf)], axis=1)
+        k = min(self.top_k, len(self.aspects))
+        mentioned = (ranked[:, :k] >= self.threshold) & (leads[:, :k] >= self.margin)
+        return [[self.aspects[i] for i in order[row, :k][mentioned[row]]] for row in range(len(ranked))]
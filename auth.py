@@ -1,21 +1,41 @@
-import firebase_admin
-from firebase_admin import credentials, auth, firestore
+from firebase_admin import firestore
 import praw
+import pandas as pd
 import streamlit as st
-
-# --- Initialize Firebase Admin SDK using Streamlit secrets ---
-try:
-    firebase_admin.get_app()
-except ValueError:
-    # Make a copy so we can edit the private_key
-    cred_dict = dict(st.secrets["firebase"])
-    cred_dict["private_key"] = cred_dict["private_key"].replace("\\n", "\n")
-    cred = credentials.Certificate(cred_dict)
-    firebase_admin.initialize_app(cred)
-
-db = firestore.client()
-
-print("Firebase initialized")
+from results import to_parquet_bytes, read_parquet_bytes
+from fakereddit import FakeReddit
+from storage import get_backend
+from cache import TTLCache
+
+# --- Initialize the user store (Firebase, the local emulator or an in-memory fake, see storage.py) ---
+db, auth = get_backend()
+
+# --- Process-wide caches shared by all sessions ---
+USER_CACHE_TTL = 10 * 60
+HISTORY_CACHE_TTL = 5 * 60
+user_id_cache = TTLCache(USER_CACHE_TTL)  # username -> uid
+user_info_cache = TTLCache(USER_CACHE_TTL)  # uid -> Firebase Auth user record
+history_cache = TTLCache(HISTORY_CACHE_TTL)  # uid -> history entries
+
+def find_user_id(username):
+    """Returns the uid registered for a username, or None. Found users are cached; misses are not."""
+    user_id = user_id_cache.get(username)
+    if user_id is not None:
+        return user_id
+    username_query = db.collection('users').where('username', '==', username).limit(1).get()
+    if not username_query:
+        return None
+    user_id = username_query[0].id
+    user_id_cache.set(username, user_id)
+    return user_id
+
+def invalidate_user(username=None, uid=None):
+    """Drops cached records after a user is changed or deleted outside this process."""
+    if username is not None:
+        user_id_cache.invalidate(username)
+    if uid is not None:
+        user_info_cache.invalidate(uid)
+        history_cache.invalidate(uid)
 
 def register_user(username, email, password):
     if not username.strip():
@@ -36,9 +56,7 @@ def register_user(username, email, password):
         return False, "Email address cannot be longer than 100 characters."
 
     try:
-        users_ref = db.collection('users')
-        username_query = users_ref.where('username', '==', username).limit(1).get()
-        if username_query:
+        if find_user_id(username) is not None:
             return False, "Username already exists."
 
         user = auth.create_user(
@@ -48,6 +66,7 @@ def register_user(username, email, password):
         )
         user_ref = db.collection('users').document(user.uid)
         user_ref.set({'username': username, 'email': email})
+        user_id_cache.set(username, user.uid)
         return True, None
     except Exception as e:
         error_message = str(e)
@@ -65,12 +84,9 @@ def login_user(username, password):
         return False, None, "Password cannot be empty."
 
     try:
-        users_ref = db.collection('users')
-        username_query = users_ref.where('username', '==', username).limit(1).get()
+        user_id = find_user_id(username)
 
-        if username_query:
-            user_doc = username_query[0]
-            user_id = user_doc.id
+        if user_id is not None:
             return True, user_id, None
         else:
             return False, None, "Invalid username or password."
@@ -79,7 +95,7 @@ def login_user(username, password):
 
 def get_user_info(uid):
     try:
-        user = auth.get_user(uid)
+        user = user_info_cache.get_or_load(uid, lambda: auth.get_user(uid))
         return user, None
     except auth.UserNotFoundError:
         return None, "User not found."
@@ -94,36 +110,63 @@ def save_user_history(uid, df_data, keyword, sorting, subreddit):
             'keyword': keyword,
             'sorting': sorting,
             'subreddit': subreddit if subreddit else "all",
-            'data': df_data.to_dict(orient='records')
+            # Stored as Parquet: far smaller than a list of row dicts and loads back without per-row conversion
+            'data_parquet': to_parquet_bytes(df_data)
         })
+        history_cache.invalidate(uid)
         return True, None
     except Exception as e:
         return False, f"Error saving history: {e}"
 
 def get_user_history(uid):
     try:
-        history_collection = db.collection('users').document(uid).collection('history').order_by('timestamp', direction=firestore.Query.DESCENDING)
-        history = history_collection.get()
-        history_data = [doc.to_dict() for doc in history]
+        def load_history():
+            history_collection = db.collection('users').document(uid).collection('history').order_by('timestamp', direction=firestore.Query.DESCENDING)
+            return [doc.to_dict() for doc in history_collection.get()]
+
+        history_data = history_cache.get_or_load(uid, load_history)
         return history_data, None
     except Exception as e:
         return None, f"Error fetching history: {e}"
 
+def load_history_data(item):
+    """Returns the analysis results of a history entry as a DataFrame, or None if it has none."""
+    if 'data_parquet' in item:
+        return read_parquet_bytes(item['data_parquet'])
+    if 'data' in item:  # Entries saved before results were stored as Parquet
+        return pd.DataFrame(item['data'])
+    return None
+
 def logout_user():
     st.session_state['user'] = None
     st.session_state['logged_in'] = False
     return True
 
-def authenticate_reddit():
-    try:
+def create_reddit_client():
+    reddit_secrets = st.secrets["reddit"]
+    if "FAKE_DATA" in reddit_secrets:
+        # Recorded Reddit data for offline runs and load tests
+        return FakeReddit.from_file(reddit_secrets["FAKE_DATA"])
+    # Optional endpoint overrides let the app run against a local fake Reddit server (see fakeserver.py)
+    overrides = {key.lower(): reddit_secrets[key] for key in ("OAUTH_URL", "REDDIT_URL") if key in reddit_secrets}
+    return praw.Reddit(
+        client_id=reddit_secrets["CLIENT_ID"],
+        client_secret=reddit_secrets["CLIENT_SECRET"],
+        user_agent=reddit_secrets["USER_AGENT"],
+        **overrides
+    )
 
-        reddit = praw.Reddit(
-            client_id=st.secrets["reddit"]["CLIENT_ID"],
-            client_secret=st.secrets["reddit"]["CLIENT_SECRET"],
-            user_agent=st.secrets["reddit"]["USER_AGENT"]
-        )
+def authenticate_reddit():
+    """Returns a new read-only Reddit client; callers keep one per session in `st.session_state['reddit']`.
 
-        return reddit
+    PRAW clients are not thread-safe, so they are not shared between sessions.
+    """
+    try:
+        return create_reddit_client()
     except Exception as e:
         st.error(f"❌ Error authenticating with Reddit: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def invalidate_reddit_client():
+    """Drops this session's client so the next analysis builds a fresh one (e.g. after credentials change)."""
+    st.session_state['reddit'] = None
@@ -0,0 +1,175 @@
+"""Headless batch runner for scheduled multi-keyword analyses.
+
+Usage:
+    python batch.py jobs.csv --output-dir results/ [--fake-reddit recording.json] [--workers 4] [--cascade-threshold 0.7] [--embedding-aspects]
+
+The jobs file is a CSV with a `keyword,subreddit,sorting` header; subreddit and
+sorting may be left blank (all of Reddit, 'new'). Each job is written to
+`<output-dir>/<job id>.parquet` and summarised in `<output-dir>/summary.json`.
+Jobs already in the summary are skipped, so an interrupted run can simply be
+restarted with the same arguments.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import praw
+
+from distilbert import PREDEFINED_ASPECTS
+from fakereddit import FakeReddit
+from getcomments import fetch_comments_with_semantic_filtering, analyze_comments
+from inference import get_inference_service
+from results import to_dense_frame
+from trends import get_trend_store
+
+SUMMARY_FILE = "summary.json"
+
+
+def read_jobs(path):
+    jobs = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            keyword = (row.get("keyword") or "").strip()
+            if not keyword:
+                continue
+            jobs.append({
+                "keyword": keyword,
+                "subreddit": (row.get("subreddit") or "").strip() or None,
+                "sorting": (row.get("sorting") or "").strip() or "new",
+            })
+    return jobs
+
+
+def job_id(job):
+    key = f"{job['keyword']}|{job['subreddit'] or 'all'}|{job['sorting']}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+
+def load_summary(output_dir):
+    path = os.path.join(output_dir, SUMMARY_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_summary(output_dir, summary):
+    # Write then rename so an interrupted run never leaves a truncated summary
+    path = os.path.join(output_dir, SUMMARY_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def summarise(job, df, output_file, seconds):
+    entry = {**job, "output": output_file, "comments": len(df), "elapsed_seconds": round(seconds, 2),
+             "complete": df.attrs.get("complete", True), "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    if "embedding_aspects_added" in df.attrs:
+        entry["embedding_aspects_added"] = df.attrs["embedding_aspects_added"]
+    if not df.empty:
+        entry["average_sentiment"] = float(df["Sentiment Score"].mean())
+        entry["aspects"] = {
+            aspect: {"mean": float(df[aspect].mean()), "mentions": int(df[aspect].count())}
+            for aspect in PREDEFINED_ASPECTS if aspect in df.columns and df[aspect].count()
+        }
+    return entry
+
+
+def connect_reddit(args):
+    if args.fake_reddit:
+        return FakeReddit.from_file(args.fake_reddit)
+    return praw.Reddit(
+        client_id=os.environ["REDDIT_CLIENT_ID"],
+        client_secret=os.environ["REDDIT_CLIENT_SECRET"],
+        user_agent=os.environ.get("REDDIT_USER_AGENT", "reddit-sentiment-batch"),
+    )
+
+
+def run(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    summary = load_summary(args.output_dir)
+    jobs = [job for job in read_jobs(args.jobs) if job_id(job) not in summary]
+    print(f"{len(jobs)} job(s) to run, {len(summary)} already done")
+    if not jobs:
+        return 0
+
+    # Parallel fetches share the models and have their embedding calls micro-batched together
+    service = get_inference_service(cascade_threshold=args.cascade_threshold,
+                                    embedding_aspects=args.embedding_aspects)
+    tokenizer, model, embedding_model = service.tokenizer, service.model, service.embedding_model
+
+    # PRAW clients are not thread-safe, so each fetch worker gets its own
+    clients = threading.local()
+
+    def fetch(job):
+        if not hasattr(clients, "reddit"):
+            clients.reddit = connect_reddit(args)
+        return fetch_comments_with_semantic_filtering(clients.reddit, job["keyword"], embedding_model,
+                                                      job["subreddit"], job["sorting"], args.similarity_threshold)
+
+    failures = 0
+    # Fetching is network-bound and runs in parallel (sharing the rate limiter and comment store);
+    # scoring runs on the main thread so the models are used by one caller at a time.
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        started = {}
+        futures = {}
+        for job in jobs:
+            started[job_id(job)] = time.monotonic()
+            future = pool.submit(fetch, job)
+            futures[future] = job
+
+        for future in as_completed(futures):
+            job = futures[future]
+            jid = job_id(job)
+            try:
+                df = analyze_comments(tokenizer, model, future.result(), service.score, service.aspect_classifier)
+                output_file = f"{jid}.parquet"
+                tmp_path = os.path.join(args.output_dir, output_file + ".tmp")
+                to_dense_frame(df).to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, os.path.join(args.output_dir, output_file))
+            except Exception as e:
+                failures += 1
+                print(f"❌ Job {jid} ({job['keyword']}) failed: {e}")
+                continue
+
+            try:
+                get_trend_store().add_frame(job["keyword"], df)
+            except Exception as e:
+                print(f"Error updating sentiment trends for job {jid}: {e}")
+
+            # Partial fetches are not recorded, so the next run retries them
+            if df.attrs.get("complete", True):
+                summary[jid] = summarise(job, df, output_file, time.monotonic() - started[jid])
+                write_summary(args.output_dir, summary)
+                print(f"✅ Job {jid} ({job['keyword']}) done: {len(df)} comments")
+            else:
+                failures += 1
+                print(f"⚠️ Job {jid} ({job['keyword']}) only partially fetched, will retry on next run")
+
+    print(f"Inference metrics: {json.dumps(service.metrics())}")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Reddit sentiment analyses without the Streamlit UI.")
+    parser.add_argument("jobs", help="CSV file with keyword,subreddit,sorting columns")
+    parser.add_argument("--output-dir", default="batch_results", help="Directory for Parquet results and summary.json")
+    parser.add_argument("--fake-reddit", help="Serve Reddit data from a recorded JSON file instead of the live API")
+    parser.add_argument("--workers", type=int, default=4, help="Number of jobs fetched in parallel")
+    parser.add_argument("--similarity-threshold", type=float, default=0.5)
+    parser.add_argument("--cascade-threshold", type=float,
+                        help="Lexicon confidence (0-1) above which DistilBERT is skipped; off unless given")
+    parser.add_argument("--embedding-aspects", action="store_true",
+                        help="Also detect aspects from comment embeddings (uncalibrated, off by default)")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
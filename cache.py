@@ -0,0 +1,60 @@
+import threading
+import time
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe key/value cache whose entries expire `ttl` seconds after being set.
+
+    Shared by all sessions in the process. Entries can be dropped explicitly with
+    `invalidate` when the underlying data changes.
+    """
+
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self.entries.pop(key, None)
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                self._evict()
+            self.entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+
+    def get_or_load(self, key, loader, ttl=None):
+        """Returns the cached value, or calls `loader()` and caches its result. Loader errors are not cached."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _evict(self):
+        # Called with self.lock held: drop expired entries, then the ones closest to expiry
+        now = time.monotonic()
+        self.entries = {k: v for k, v in self.entries.items() if v[1] >= now}
+        if len(self.entries) >= self.max_entries:
+            for key, _ in sorted(self.entries.items(), key=lambda item: item[1][1])[:len(self.entries) // 10 + 1]:
+                del self.entries[key]
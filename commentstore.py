@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_STORE_PATH = os.path.join(".cache", "reddit_comments.sqlite")
+MAX_AGE = 6 * 60 * 60  # Re-fetch a post's comments after 6 hours...
+SETTLED_AGE = 7 * 24 * 60 * 60  # ...unless the post was already a week old when we fetched it
+MAX_SUBMISSIONS = 20000  # Disk bound: keep at most this many posts
+EVICT_AGE = 30 * 24 * 60 * 60  # Drop posts not re-fetched in 30 days
+COMPACT_INTERVAL = 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id TEXT PRIMARY KEY,
+    subreddit TEXT,
+    title TEXT,
+    created_utc REAL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS comments (
+    id TEXT PRIMARY KEY,
+    submission_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    created_utc REAL,
+    score INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_comments_submission ON comments (submission_id, position);
+CREATE INDEX IF NOT EXISTS idx_submissions_fetched ON submissions (fetched_at);
+"""
+
+
+class CommentStore:
+    """SQLite store of raw Reddit submissions and their comments, keyed by Reddit ID.
+
+    Lets overlapping searches reuse comment forests that were downloaded recently
+    instead of hitting the API again.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, max_age=MAX_AGE, settled_age=SETTLED_AGE):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_age = max_age
+        self.settled_age = settled_age
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.last_compacted = 0
+
+    def is_fresh(self, fetched_at, created_utc, now=None):
+        now = now or time.time()
+        if now - fetched_at <= self.max_age:
+            return True
+        # Old threads rarely get new comments, so an old snapshot is still good
+        return created_utc is not None and fetched_at - created_utc >= self.settled_age
+
+    def get_comments(self, submission_id):
+        """Returns the stored comments for a submission as a list of dicts, or None if missing or stale."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT fetched_at, created_utc FROM submissions WHERE id = ?", (submission_id,)
+            ).fetchone()
+            if row is None or not self.is_fresh(*row):
+                return None
+            rows = self.conn.execute(
+                "SELECT id, body, created_utc, score FROM comments WHERE submission_id = ? ORDER BY position",
+                (submission_id,)
+            ).fetchall()
+        return [{"id": r[0], "body": r[1], "created_utc": r[2], "score": r[3]} for r in rows]
+
+    def put_comments(self, submission, comments):
+        """Replaces the stored comments for a submission. `comments` is a list of dicts as returned by `get_comments`."""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO submissions (id, subreddit, title, created_utc, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (submission["id"], submission.get("subreddit"), submission.get("title"), submission.get("created_utc"), now)
+            )
+            self.conn.execute("DELETE FROM comments WHERE submission_id = ?", (submission["id"],))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO comments (id, submission_id, position, body, created_utc, score) VALUES (?, ?, ?, ?, ?, ?)",
+                [(c["id"], submission["id"], i, c["body"], c.get("created_utc"), c.get("score")) for i, c in enumerate(comments)]
+            )
+
+    def compact(self, max_submissions=MAX_SUBMISSIONS, evict_age=EVICT_AGE):
+        """Evicts posts not fetched within `evict_age` and the oldest posts beyond `max_submissions`."""
+        cutoff = time.time() - evict_age
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM submissions WHERE fetched_at < ?", (cutoff,))
+            self.conn.execute(
+                "DELETE FROM submissions WHERE id NOT IN (SELECT id FROM submissions ORDER BY fetched_at DESC LIMIT ?)",
+                (max_submissions,)
+            )
+            removed = self.conn.execute(
+                "DELETE FROM comments WHERE submission_id NOT IN (SELECT id FROM submissions)"
+            ).rowcount
+        if removed:
+            with self.lock:
+                self.conn.execute("VACUUM")
+        self.last_compacted = time.time()
+        return removed
+
+    def maybe_compact(self):
+        if time.time() - self.last_compacted >= COMPACT_INTERVAL:
+            self.compact()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_comment_store():
+    """Returns the process-wide comment store, shared by all sessions."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CommentStore()
+        return _store
@@ -0,0 +1,134 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+
+from praw.models import MoreComments
+
+MAX_API_CALLS = 200  # Per analysis
+MAX_SECONDS = 120  # Per analysis
+MAX_CALLS_PER_POST = 20  # Keeps the first few posts from using the whole budget
+
+# Priority weights for expanding a MoreComments node
+RELEVANCE_WEIGHT = 2.0
+SCORE_WEIGHT = 0.5
+COUNT_WEIGHT = 0.25
+DEPTH_PENALTY = 0.3
+
+
+class DeepCrawler:
+    """Expands the `MoreComments` stubs of comment trees under a shared API-call and wall-time budget.
+
+    Stubs are expanded one at a time, most promising first: stubs whose parent is relevant
+    to the keyword, highly upvoted, shallow and hiding many replies come first. Stubs revealed
+    by an expansion are ranked using the comments loaded so far. Expansion is sequential on purpose: the
+    stubs belong to one PRAW client, which is not thread-safe, so the scheduler would run
+    parallel expansions one after another anyway. Per-post coverage is collected in `coverage`.
+
+    If the budget runs out while a request is waiting (TimeoutError from the scheduler), the
+    crawler marks itself exhausted and re-raises, so callers can fall back to plain fetching.
+    """
+
+    def __init__(self, scheduler, max_api_calls=MAX_API_CALLS, max_seconds=MAX_SECONDS,
+                 max_calls_per_post=MAX_CALLS_PER_POST):
+        self.scheduler = scheduler
+        self.max_api_calls = max_api_calls
+        self.max_calls_per_post = max_calls_per_post
+        self.deadline = time.monotonic() + max_seconds
+        self.api_calls = 0
+        self.lock = threading.Lock()
+        self.coverage = []
+
+    def _take_call(self):
+        with self.lock:
+            if self.api_calls >= self.max_api_calls or time.monotonic() >= self.deadline:
+                return False
+            self.api_calls += 1
+            return True
+
+    def _request(self, func, reddit):
+        try:
+            return self.scheduler.call(func, reddit=reddit, deadline=self.deadline)
+        except TimeoutError:
+            with self.lock:
+                self.deadline = time.monotonic()  # No time left for another request
+            raise
+
+    def exhausted(self):
+        return self.api_calls >= self.max_api_calls or time.monotonic() >= self.deadline
+
+    @staticmethod
+    def _priority(more, parents):
+        score, relevance = parents.get(more.parent_id, (0, 0.0))
+        return (RELEVANCE_WEIGHT * relevance
+                + SCORE_WEIGHT * math.log1p(max(score, 0))
+                + COUNT_WEIGHT * math.log1p(getattr(more, "count", 0))
+                - DEPTH_PENALTY * getattr(more, "depth", 0))
+
+    def crawl(self, reddit, post, embed_fn):
+        """Loads as much of a post's comment tree as the budget allows.
+
+        `embed_fn(texts)` returns (embeddings, keyword similarities) for comment bodies; it is
+        used both to rank stubs and to hand the embeddings back to the caller. Returns a list
+        of comment dicts with "id", "body", "created_utc", "score", "depth", "embedding" and
+        "similarity" keys.
+        """
+        if not self._take_call():
+            return []
+        self._request(lambda: post.comments.list(), reddit)  # Loads the first page of the tree
+        post_calls = 1
+
+        comments = []
+        parents = {f"t3_{post.id}": (getattr(post, "score", 0), 1.0)}
+        queue = []
+        tiebreak = itertools.count()
+
+        def add(items):
+            new_comments = [item for item in items if not isinstance(item, MoreComments)]
+            if new_comments:
+                embeddings, similarities = embed_fn([c.body for c in new_comments])
+                for c, embedding, similarity in zip(new_comments, embeddings, similarities):
+                    parents[f"t1_{c.id}"] = (c.score, float(similarity))
+                    comments.append({"id": c.id, "body": c.body, "created_utc": c.created_utc, "score": c.score,
+                                     "depth": getattr(c, "depth", 0), "embedding": embedding, "similarity": float(similarity)})
+            for item in items:
+                if isinstance(item, MoreComments):
+                    heapq.heappush(queue, (-self._priority(item, parents), next(tiebreak), item))
+
+        add(post.comments.list())
+
+        while queue and post_calls < self.max_calls_per_post and self._take_call():
+            more = heapq.heappop(queue)[2]
+            post_calls += 1
+            try:
+                expanded = self._request(more.comments, reddit)
+            except TimeoutError:
+                break  # Budget spent; keep what this post has so far
+            except Exception as e:
+                print(f"Error expanding comments for post {post.id}: {e}")
+                continue
+            add(flatten_comments(expanded))
+
+        total = getattr(post, "num_comments", 0) or len(comments)
+        self.coverage.append({
+            "post_id": post.id,
+            "title": getattr(post, "title", ""),
+            "comments_loaded": len(comments),
+            "comments_total": total,
+            "coverage": min(1.0, len(comments) / total) if total else 1.0,
+            "api_calls": post_calls,
+            "unexpanded_stubs": len(queue),
+            "max_depth": max((c["depth"] for c in comments), default=0),
+        })
+        return comments
+
+
+def flatten_comments(items):
+    """Flattens comments returned by `MoreComments.comments()` together with their loaded replies."""
+    flat = []
+    for item in items:
+        flat.append(item)
+        if not isinstance(item, MoreComments):
+            flat.extend(item.replies.list())
+    return flat
@@ -1,4 +1,6 @@
 import re
+import threading
+from collections import deque
 import torch
 import demoji
 import pandas as pd
@@ -57,44 +59,337 @@ def load_distilbert():
     return tokenizer, model
 
 
+MAX_TOKENS = 512
+WINDOW_OVERLAP = 128  # Tokens shared by consecutive windows of a long text
+
 def analyze_sentiment_bert(tokenizer, model, text):
     """Analyze sentiment using DistilBERT model."""
-    # Tokenize and encode the input text
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=512)
+    return analyze_sentiment_bert_batch(tokenizer, model, [text])
 
-    # Get the model outputs (logits)
-    with torch.no_grad():
-        outputs = model(**inputs)
+def split_token_windows(token_ids, window_size, overlap):
+    """Splits token ids into windows of at most `window_size`, consecutive windows sharing `overlap` tokens."""
+    if len(token_ids) <= window_size:
+        return [token_ids]
+    step = window_size - overlap
+    starts = range(0, len(token_ids) - overlap, step)
+    return [token_ids[start:start + window_size] for start in starts]
 
-    logits = outputs.logits  # Get logits from the model's output
+def analyze_sentiment_bert_batch(tokenizer, model, texts, batch_size=32, long_text=True, overlap=WINDOW_OVERLAP):
+    """Analyze sentiment for many texts in shared, padded forward passes.
 
-    # Apply softmax to get probabilities
-    probabilities = torch.nn.functional.softmax(logits, dim=-1)
+    Texts longer than the model's 512-token limit are split into overlapping windows
+    (or, with `long_text=False`, truncated as before). Windows from all texts are sorted
+    by length and batched together, so cost grows with the total number of tokens. Each
+    text's score is the mean of its windows' scores, weighted by the tokens each window
+    adds beyond the previous one's overlap.
 
-    # Calculate the sentiment score based on probabilities (assuming a 0-4 range)
-    sentiment_score = np.dot(probabilities.numpy(), np.array([0, 1, 2, 3, 4]))  # Weighted sentiment score
-    
-    # Scale sentiment score to range [0, 1]
-    scaled_sentiment_score = sentiment_score / 4
-    
-    return scaled_sentiment_score
+    Returns a NumPy array of scaled scores in [0, 1], one per text.
+    """
+    if len(texts) == 0:
+        return np.empty(0)
 
-def extract_aspect_sentiment(tokenizer, model, text):
-    """Extracts sentiment scores for predefined aspects using DistilBERT."""
-    aspect_sentiments = {aspect: [] for aspect in PREDEFINED_ASPECTS.keys()}
+    # Tokenize once without special tokens; [CLS] and [SEP] are added per window
+    window_size = MAX_TOKENS - 2
+    token_ids = tokenizer(list(texts), add_special_tokens=False, truncation=False, verbose=False)["input_ids"]
 
+    windows, owners, new_tokens = [], [], []
+    for text_index, ids in enumerate(token_ids):
+        text_windows = split_token_windows(ids, window_size, overlap) if long_text else [ids[:window_size]]
+        for position, window in enumerate(text_windows):
+            windows.append([tokenizer.cls_token_id] + window + [tokenizer.sep_token_id])
+            owners.append(text_index)
+            # Tokens not already covered by the previous window, so overlaps are not counted twice
+            new_tokens.append(len(window) - (overlap if position else 0))
+
+    # Batch similar lengths together to keep padding small
+    order = sorted(range(len(windows)), key=lambda i: len(windows[i]))
+    window_scores = np.empty(len(windows))
+    for start in range(0, len(order), batch_size):
+        chunk = order[start:start + batch_size]
+        inputs = tokenizer.pad({"input_ids": [windows[i] for i in chunk]}, return_tensors="pt")
+
+        with torch.no_grad():
+            outputs = model(**inputs)
+
+        # Calculate the sentiment score based on probabilities (assuming a 0-4 range), scaled to [0, 1]
+        probabilities = torch.nn.functional.softmax(outputs.logits, dim=-1)
+        window_scores[chunk] = np.dot(probabilities.numpy(), np.array([0, 1, 2, 3, 4])) / 4
+
+    # Mean of each text's windows, weighted by the tokens each window adds
+    owners = np.array(owners)
+    weights = np.array(new_tokens, dtype=float).clip(min=1)
+    totals = np.bincount(owners, weights=weights * window_scores, minlength=len(texts))
+    return totals / np.bincount(owners, weights=weights, minlength=len(texts))
+
+def split_aspect_segments(text):
+    """Splits text on contrast words and returns (segment, [aspects mentioned]) for segments mentioning an aspect."""
+    segments = []
     contrast_split = re.split(r'\b(but|and|however|although|,)\b', text, flags=re.IGNORECASE)
 
     for segment in contrast_split:
         segment = segment.strip()
+        lowered = segment.lower()
+        aspects = [aspect for aspect, keywords in PREDEFINED_ASPECTS.items() if any(keyword in lowered for keyword in keywords)]
+        if aspects:
+            segments.append((segment, aspects))
 
-        for aspect, keywords in PREDEFINED_ASPECTS.items():
-            if any(keyword in segment.lower() for keyword in keywords):
-                aspect_score = analyze_sentiment_bert(tokenizer, model, segment)
-                aspect_sentiments[aspect].append(aspect_score)
+    return segments
+
+def aggregate_aspect_scores(segments, scores):
+    """Averages segment scores per aspect. Aspects that are not mentioned stay None."""
+    aspect_sentiments = {aspect: [] for aspect in PREDEFINED_ASPECTS.keys()}
+    for (_, aspects), score in zip(segments, scores):
+        for aspect in aspects:
+            aspect_sentiments[aspect].append(score)
 
     return {
         aspect: np.mean(scores) if scores else None  # Keep None if no aspect is mentioned
         for aspect, scores in aspect_sentiments.items()
     }
 
+def extract_aspect_sentiment(tokenizer, model, text):
+    """Extracts sentiment scores for predefined aspects using DistilBERT."""
+    segments = split_aspect_segments(text)
+    scores = analyze_sentiment_bert_batch(tokenizer, model, [segment for segment, _ in segments])
+    return aggregate_aspect_scores(segments, scores)
+
+
+# --- Cascade: cheap lexicon scorer first, DistilBERT only for uncertain texts ---
+
+SEED_LEXICON = {
+    "love": 2.0, "amazing": 2.0, "excellent": 2.0, "awesome": 2.0, "perfect": 2.0, "best": 1.5, "fantastic": 2.0,
+    "incredible": 2.0, "great": 1.5, "impressed": 1.5, "recommend": 1.5, "beautiful": 1.5, "good": 1.0,
+    "solid": 1.0, "smooth": 1.0, "fast": 0.8, "happy": 1.0, "worth": 1.0, "nice": 1.0, "reliable": 1.0,
+    "hate": -2.0, "garbage": -2.0, "terrible": -2.0, "awful": -2.0, "worst": -2.0, "trash": -2.0, "horrible": -2.0,
+    "junk": -2.0, "useless": -2.0, "sucks": -2.0, "crap": -2.0, "disappointed": -1.5, "disappointing": -1.5,
+    "broken": -1.5, "regret": -1.5, "refund": -1.0, "bad": -1.0, "poor": -1.0, "slow": -0.8, "laggy": -1.0,
+    "overpriced": -1.0, "annoying": -1.0,
+}
+NEGATIONS = {"not", "no", "never", "dont", "don't", "doesnt", "doesn't", "isnt", "isn't", "wasnt", "wasn't", "cant", "can't", "wont", "won't"}
+NEGATION_SCOPE = 3
+MAX_VOCABULARY = 1000
+CASCADE_THRESHOLD = 0.6  # Lexicon confidence (0-1) required to skip DistilBERT
+AUDIT_FRACTION = 0.05  # Share of confident texts still sent to DistilBERT to measure agreement
+REFIT_EVERY = 500  # Refit the lexicon after this many new DistilBERT-labelled texts
+CALIBRATION_BUFFER = 2000
+MIN_AUDIT_AGREEMENT = 0.85  # Label agreement with DistilBERT below which the cascade switches itself off
+MIN_AUDITS = 50  # Audited texts needed before agreement is judged
+AUDIT_WINDOW = 500  # Only the most recent audits count towards agreement
+
+def tokenize_for_lexicon(text):
+    """Lowercased word tokens; words within NEGATION_SCOPE after a negation get a NOT_ prefix."""
+    tokens = []
+    negated = 0
+    for token in re.findall(r"[a-z']+", text.lower()):
+        if token in NEGATIONS:
+            negated = NEGATION_SCOPE
+            continue
+        tokens.append("NOT_" + token if negated else token)
+        negated = max(0, negated - 1)
+    return tokens
+
+class LexiconScorer:
+    """Linear bag-of-words sentiment scorer, fitted to DistilBERT's scores.
+
+    Predicts sigmoid(bias + sum of token weights / sqrt(length)) on the same [0, 1] scale as
+    `analyze_sentiment_bert`. Confidence is how far the prediction sits from neutral, scaled
+    by the share of tokens the lexicon knows.
+    """
+
+    def __init__(self, weights, bias=0.0):
+        self.vocabulary = {token: i for i, token in enumerate(weights)}
+        self.weights = np.array(list(weights.values()), dtype=np.float32)
+        self.bias = bias
+
+    @classmethod
+    def seeded(cls):
+        weights = dict(SEED_LEXICON)
+        weights.update({"NOT_" + token: -0.5 * weight for token, weight in SEED_LEXICON.items()})
+        return cls(weights)
+
+    def _token_ids(self, texts):
+        text_ids, token_ids, lengths = [], [], np.zeros(len(texts), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = tokenize_for_lexicon(text)
+            lengths[i] = len(tokens)
+            ids = [self.vocabulary[t] for t in tokens if t in self.vocabulary]
+            token_ids.extend(ids)
+            text_ids.extend([i] * len(ids))
+        return np.array(text_ids, dtype=np.int64), np.array(token_ids, dtype=np.int64), lengths
+
+    def predict(self, texts):
+        """Returns (scores, confidences) as NumPy arrays."""
+        text_ids, token_ids, lengths = self._token_ids(texts)
+        norm = np.sqrt(np.maximum(lengths, 1))
+        sums = np.bincount(text_ids, weights=self.weights[token_ids], minlength=len(texts)) / norm
+        known = np.bincount(text_ids, weights=(self.weights[token_ids] != 0).astype(np.float32), minlength=len(texts))
+        scores = 1 / (1 + np.exp(-(self.bias + sums)))
+        coverage = np.minimum(1.0, 2 * known / np.maximum(lengths, 1))
+        return scores, np.abs(scores - 0.5) * 2 * coverage
+
+    @classmethod
+    def fit(cls, texts, target_scores, l2=1.0, max_vocabulary=MAX_VOCABULARY):
+        """Ridge regression of DistilBERT's logit-scaled scores on normalised token counts, seeded with SEED_LEXICON."""
+        counts = {}
+        tokenized = [tokenize_for_lexicon(text) for text in texts]
+        for tokens in tokenized:
+            for token in set(tokens):
+                counts[token] = counts.get(token, 0) + 1
+        seed = cls.seeded()
+        vocabulary = list(dict.fromkeys(sorted(counts, key=counts.get, reverse=True)[:max_vocabulary] + list(seed.vocabulary)))
+        index = {token: i for i, token in enumerate(vocabulary)}
+
+        X = np.zeros((len(texts), len(vocabulary)), dtype=np.float64)
+        for row, tokens in enumerate(tokenized):
+            norm = np.sqrt(max(len(tokens), 1))
+            for token in tokens:
+                if token in index:
+                    X[row, index[token]] += 1 / norm
+        y = np.asarray(target_scores, dtype=np.float64).clip(0.02, 0.98)
+        y = np.log(y / (1 - y))
+
+        # Shrink towards the seed lexicon instead of towards zero
+        prior = np.array([seed.weights[seed.vocabulary[t]] if t in seed.vocabulary else 0.0 for t in vocabulary])
+        bias = y.mean()
+        A = X.T @ X + l2 * np.eye(len(vocabulary))
+        w = np.linalg.solve(A, X.T @ (y - bias) + l2 * prior)
+        return cls(dict(zip(vocabulary, w)), bias)
+
+class CascadeScorer:
+    """Scores texts with the lexicon and defers only low-confidence texts to `full_scorer` (DistilBERT).
+
+    A small random audit share of confident texts is also sent to the full model; together with the
+    deferred texts these become calibration data. Every REFIT_EVERY samples a refitted lexicon is tried
+    and kept only if it agrees with DistilBERT on held-out calibration texts at least as well as the
+    current one and no worse than `min_agreement`. If agreement over the recent audits drops below
+    `min_agreement`, the cascade disables itself and every text goes to the full model.
+    """
+
+    def __init__(self, full_scorer, lexicon=None, threshold=CASCADE_THRESHOLD, audit_fraction=AUDIT_FRACTION, refit_every=REFIT_EVERY,
+                 min_agreement=MIN_AUDIT_AGREEMENT):
+        self.full_scorer = full_scorer
+        self.lexicon = lexicon or LexiconScorer.seeded()
+        self.threshold = threshold
+        self.audit_fraction = audit_fraction
+        self.refit_every = refit_every
+        self.min_agreement = min_agreement
+        self.enabled = True
+        self.recent_audits = deque(maxlen=AUDIT_WINDOW)
+        self.rng = np.random.default_rng()
+        self.calibration_texts, self.calibration_scores = [], []
+        self.new_samples = 0
+        self.lock = threading.Lock()
+        self.stats = {"texts": 0, "deferred": 0, "audited": 0, "audit_agreements": 0, "refits": 0, "rejected_refits": 0}
+
+    def __call__(self, texts):
+        texts = list(texts)
+        if not texts:
+            return np.empty(0)
+        if not self.enabled:
+            with self.lock:
+                self.stats["texts"] += len(texts)
+                self.stats["deferred"] += len(texts)
+            return np.asarray(self.full_scorer(texts), dtype=float)
+        scores, confidences = self.lexicon.predict(texts)
+        confident = confidences >= self.threshold
+        with self.lock:
+            draws = self.rng.random(len(texts))  # numpy Generators are not thread-safe
+        audit = confident & (draws < self.audit_fraction)
+        to_model = np.flatnonzero(~confident | audit)
+
+        model_scores = np.asarray(self.full_scorer([texts[i] for i in to_model]), dtype=float) if len(to_model) else np.empty(0)
+        audited = audit[to_model]
+        audit_outcomes = sentiment_bins(scores[to_model][audited]) == sentiment_bins(model_scores[audited])
+        agreements = int(audit_outcomes.sum())
+        scores[to_model] = model_scores
+
+        with self.lock:
+            self.stats["texts"] += len(texts)
+            self.stats["deferred"] += int((~confident).sum())
+            self.stats["audited"] += int(audited.sum())
+            self.stats["audit_agreements"] += agreements
+            self.recent_audits.extend(audit_outcomes.tolist())
+            if len(self.recent_audits) >= MIN_AUDITS and np.mean(self.recent_audits) < self.min_agreement:
+                self.enabled = False
+                print(f"⚠️ Cascade disabled: lexicon agrees with DistilBERT on {np.mean(self.recent_audits):.0%} of recent audits")
+            if len(to_model):
+                self._record([texts[i] for i in to_model], model_scores)
+        return scores
+
+    def _record(self, texts, scores):
+        # Called with self.lock held
+        self.calibration_texts = (self.calibration_texts + texts)[-CALIBRATION_BUFFER:]
+        self.calibration_scores = (self.calibration_scores + list(scores))[-CALIBRATION_BUFFER:]
+        self.new_samples += len(texts)
+        if self.new_samples >= self.refit_every:
+            self._try_refit()
+            self.new_samples = 0
+
+    def _try_refit(self):
+        # Called with self.lock held: fit on half the calibration data, compare both lexicons on the other half
+        texts, scores = self.calibration_texts, np.asarray(self.calibration_scores)
+        train, test = slice(0, None, 2), slice(1, None, 2)
+        candidate = LexiconScorer.fit(texts[train], scores[train])
+        candidate_agreement = self._confident_agreement(candidate, texts[test], scores[test])
+        current_agreement = self._confident_agreement(self.lexicon, texts[test], scores[test])
+        if candidate_agreement is None or candidate_agreement < max(self.min_agreement, current_agreement or 0.0):
+            self.stats["rejected_refits"] += 1
+            return
+        self.lexicon = LexiconScorer.fit(texts, scores)
+        self.stats["refits"] += 1
+
+    def _confident_agreement(self, lexicon, texts, scores):
+        """Label agreement with `scores` on the texts `lexicon` would answer itself, or None if too few."""
+        predictions, confidences = lexicon.predict(texts)
+        confident = confidences >= self.threshold
+        if confident.sum() < MIN_AUDITS:
+            return None
+        return float(np.mean(sentiment_bins(predictions[confident]) == sentiment_bins(scores[confident])))
+
+    def deferred_fraction(self):
+        return self.stats["deferred"] / self.stats["texts"] if self.stats["texts"] else 0.0
+
+    def metrics(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats["deferred_fraction"] = self.deferred_fraction()
+        stats["audit_agreement"] = stats["audit_agreements"] / stats["audited"] if stats["audited"] else None
+        stats["enabled"] = self.enabled
+        return stats
+
+def sentiment_bins(scores):
+    """Index of the five sentiment labels (Very Negative .. Very Positive) for each score."""
+    return np.clip((np.asarray(scores) / 0.2).astype(int), 0, 4)
+
+def evaluate_cascade(tokenizer, model, texts, thresholds=(0.4, 0.5, 0.6, 0.7, 0.8)):
+    """Compares the cascade to full DistilBERT scoring on `texts` for several thresholds.
+
+    The lexicon is fitted on half the texts and evaluated on the other half. Returns one dict per
+    threshold with the deferred fraction, label agreement and mean absolute error.
+    """
+    full_scores = analyze_sentiment_bert_batch(tokenizer, model, texts)
+    train, test = list(range(0, len(texts), 2)), list(range(1, len(texts), 2))
+    lexicon = LexiconScorer.fit([texts[i] for i in train], full_scores[train])
+    test_texts, test_scores = [texts[i] for i in test], full_scores[test]
+
+    report = []
+    for threshold in thresholds:
+        cascade = CascadeScorer(lambda batch: analyze_sentiment_bert_batch(tokenizer, model, batch), lexicon, threshold, audit_fraction=0.0, refit_every=np.inf)
+        scores = cascade(test_texts)
+        report.append({
+            "threshold": threshold,
+            "deferred_fraction": cascade.deferred_fraction(),
+            "label_agreement": float(np.mean(sentiment_bins(scores) == sentiment_bins(test_scores))),
+            "mean_absolute_error": float(np.mean(np.abs(scores - test_scores))),
+        })
+    return report
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    fixture_path = sys.argv[1] if len(sys.argv) > 1 else "fixtures/cascade_comments.txt"
+    with open(fixture_path, encoding="utf-8") as f:
+        fixture_texts = [clean_text_for_distilbert(line) for line in f if line.strip()]
+    tokenizer, model = load_distilbert()
+    print(json.dumps(evaluate_cascade(tokenizer, model, fixture_texts), indent=2))
@@ -0,0 +1,134 @@
+import copy
+import itertools
+import threading
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from firebase_admin import firestore
+
+_lock = threading.RLock()
+_ids = itertools.count()
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class FakeQuery:
+    def __init__(self, collection, filters=(), order=None, limit_count=None):
+        self.collection = collection
+        self.filters = list(filters)
+        self.order = order
+        self.limit_count = limit_count
+
+    def where(self, field, op, value):
+        if op != "==":
+            raise NotImplementedError(f"FakeFirestore only supports '==' filters, got '{op}'")
+        return FakeQuery(self.collection, self.filters + [(field, value)], self.order, self.limit_count)
+
+    def order_by(self, field, direction=None):
+        return FakeQuery(self.collection, self.filters, (field, direction), self.limit_count)
+
+    def limit(self, count):
+        return FakeQuery(self.collection, self.filters, self.order, count)
+
+    def get(self):
+        with _lock:
+            docs = [(doc_id, doc.data) for doc_id, doc in self.collection.documents.items() if doc.data is not None]
+        docs = [(doc_id, data) for doc_id, data in docs if all(data.get(f) == v for f, v in self.filters)]
+        if self.order:
+            field, direction = self.order
+            docs.sort(key=lambda d: d[1].get(field), reverse=direction == firestore.Query.DESCENDING)
+        if self.limit_count is not None:
+            docs = docs[:self.limit_count]
+        return [FakeDocumentSnapshot(doc_id, data) for doc_id, data in docs]
+
+    stream = get
+
+
+class FakeDocument:
+    def __init__(self, doc_id):
+        self.id = doc_id
+        self.data = None
+        self.collections = {}
+
+    def set(self, data):
+        now = datetime.now(timezone.utc)
+        with _lock:
+            self.data = {k: (now if v is firestore.SERVER_TIMESTAMP else copy.deepcopy(v)) for k, v in data.items()}
+
+    def get(self):
+        with _lock:
+            return FakeDocumentSnapshot(self.id, self.data)
+
+    def delete(self):
+        with _lock:
+            self.data = None
+
+    def collection(self, name):
+        with _lock:
+            return self.collections.setdefault(name, FakeCollection(name))
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, name):
+        self.name = name
+        self.documents = {}
+        super().__init__(self)
+
+    def document(self, doc_id=None):
+        doc_id = doc_id or uuid.uuid4().hex
+        with _lock:
+            return self.documents.setdefault(doc_id, FakeDocument(doc_id))
+
+    def add(self, data):
+        doc = self.document(f"{next(_ids):020d}")
+        doc.set(data)
+        return None, doc
+
+
+class FakeFirestore:
+    """In-memory stand-in for the Firestore client, covering the calls the app makes."""
+
+    def __init__(self):
+        self.collections = {}
+
+    def collection(self, name):
+        with _lock:
+            return self.collections.setdefault(name, FakeCollection(name))
+
+
+class UserNotFoundError(Exception):
+    pass
+
+
+class FakeAuth:
+    """In-memory stand-in for `firebase_admin.auth`."""
+
+    UserNotFoundError = UserNotFoundError
+
+    def __init__(self):
+        self.users = {}
+
+    def create_user(self, email, password, display_name=None):
+        with _lock:
+            if any(user.email == email for user in self.users.values()):
+                raise ValueError("EMAIL_EXISTS")
+            if "@" not in email:
+                raise ValueError("INVALID_EMAIL")
+            user = SimpleNamespace(uid=uuid.uuid4().hex, email=email, display_name=display_name)
+            self.users[user.uid] = user
+            return user
+
+    def get_user(self, uid):
+        with _lock:
+            if uid not in self.users:
+                raise UserNotFoundError(uid)
+            return self.users[uid]
@@ -0,0 +1,131 @@
+import json
+import time
+from types import SimpleNamespace
+import prawcore
+
+
+class FakeComment:
+    def __init__(self, data):
+        self.id = data["id"]
+        self.body = data["body"]
+        self.created_utc = data.get("created_utc", 0)
+        self.score = data.get("score", 0)
+
+
+class FakeCommentForest:
+    def __init__(self, comments):
+        self._comments = [FakeComment(c) for c in comments]
+
+    def replace_more(self, limit=32):
+        return []
+
+    def list(self):
+        return list(self._comments)
+
+
+class FakeSubmission:
+    def __init__(self, data):
+        self.id = data["id"]
+        self.title = data.get("title", "")
+        self.subreddit = data.get("subreddit", "")
+        self.created_utc = data.get("created_utc", 0)
+        self.score = data.get("score", 0)
+        self.comments = FakeCommentForest(data.get("comments", []))
+
+
+class FakeSubreddit:
+    def __init__(self, reddit, name):
+        self.reddit = reddit
+        self.display_name = name
+
+    def search(self, query, sort="relevance", limit=100):
+        terms = query.strip('"').lower()
+        posts = [
+            p for p in self.reddit.submissions
+            if (self.display_name == "all" or p.get("subreddit", "").lower() == self.display_name.lower())
+            and (terms in p.get("title", "").lower() or any(terms in c["body"].lower() for c in p.get("comments", [])))
+        ]
+        if sort == "new":
+            posts.sort(key=lambda p: p.get("created_utc", 0), reverse=True)
+        elif sort in ("top", "hot"):
+            posts.sort(key=lambda p: p.get("score", 0), reverse=True)
+        return FakeListing(self.reddit, posts[:limit])
+
+
+class FakeListing:
+    """Lazy listing that, like PRAW's `ListingGenerator`, loads its items a page at a time in `_next_batch`."""
+
+    PAGE_SIZE = 100
+
+    def __init__(self, reddit, posts):
+        self.reddit = reddit
+        self.posts = posts
+        self._listing = None
+        self._list_index = 0
+        self._offset = 0
+        self._exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._listing is None or self._list_index >= len(self._listing):
+            self._next_batch()
+        self._list_index += 1
+        return self._listing[self._list_index - 1]
+
+    def _next_batch(self):
+        if self._exhausted:
+            raise StopIteration()
+        if self.reddit.latency:
+            time.sleep(self.reddit.latency)
+        page = self.posts[self._offset:self._offset + self.PAGE_SIZE]
+        self._offset += len(page)
+        self._exhausted = self._offset >= len(self.posts)
+        if not page:
+            raise StopIteration()
+        self._listing = [FakeSubmission(data) for data in page]
+        self._list_index = 0
+
+
+class FakeSubreddits:
+    def __init__(self, reddit):
+        self.reddit = reddit
+
+    def search_by_name(self, query, exact=False):
+        names = {p.get("subreddit", "").lower() for p in self.reddit.submissions}
+        if exact and query.lower() not in names:
+            raise prawcore.exceptions.NotFound(SimpleNamespace(status_code=404, headers={}))
+        return [FakeSubreddit(self.reddit, name) for name in names if query.lower() in name]
+
+
+class FakeAuth:
+    limits = {}
+
+
+class FakeReddit:
+    """Offline stand-in for `praw.Reddit`, serving recorded submissions and comments.
+
+    Covers only the PRAW surface the app uses. Recordings are JSON lists of
+    submissions: {"id", "title", "subreddit", "created_utc", "score", "comments": [{"id", "body", "created_utc", "score"}]}.
+    """
+
+    def __init__(self, submissions, latency=0.0):
+        self.submissions = submissions
+        self.latency = latency
+        self.subreddits = FakeSubreddits(self)
+        self.auth = FakeAuth()
+
+    @classmethod
+    def from_file(cls, path, latency=0.0):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), latency=latency)
+
+    def subreddit(self, name):
+        return FakeSubreddit(self, name)
+
+    def submission(self, id):
+        for data in self.submissions:
+            if data["id"] == id:
+                return FakeSubmission(data)
+        raise prawcore.exceptions.NotFound(SimpleNamespace(status_code=404, headers={}))
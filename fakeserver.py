@@ -0,0 +1,402 @@
+"""Local HTTP server that speaks enough of Reddit's API for PRAW, with scripted 429s and rate-limit headers.
+
+Point a real `praw.Reddit` at it with `oauth_url`/`reddit_url` (or set OAUTH_URL/REDDIT_URL in
+the `[reddit]` secrets) to exercise the request scheduler end to end without network access.
+
+Usage:
+    python fakeserver.py          # runs the scheduler checks below; non-zero exit status on failure
+    python fakeserver.py --serve  # serves synthetic data until interrupted
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROUTES = [
+    ("POST", re.compile(r"^/api/v1/access_token/?$"), "access_token"),
+    ("GET", re.compile(r"^/r/(?P<subreddit>[^/]+)/search/?$"), "search"),
+    ("GET", re.compile(r"^/comments/(?P<post_id>[^/]+)/?$"), "comments"),
+    ("POST", re.compile(r"^/api/search_reddit_names/?$"), "subreddit_names"),
+]
+
+
+def build_submissions(n_posts=12, comments_per_post=3, keyword="pixel 8", subreddit="gadgets"):
+    """Synthetic recording in the FakeReddit format, newest post first."""
+    now = int(time.time())
+    return [{
+        "id": f"p{i}",
+        "title": f"Thoughts on the {keyword}?",
+        "subreddit": subreddit,
+        "created_utc": now - i * 3600,
+        "score": 10 * (n_posts - i),
+        "comments": [{
+            "id": f"p{i}c{j}",
+            "body": f"The {keyword} battery is great, comment {j}",
+            "created_utc": now - i * 3600 + j * 60,
+            "score": j,
+        } for j in range(comments_per_post)],
+    } for i in range(n_posts)]
+
+
+class FakeRedditServer:
+    """Serves recorded submissions over HTTP in Reddit's JSON listing format.
+
+    Every response carries `x-ratelimit-used/remaining/reset` headers for a fixed window of
+    `rate_limit` requests per `window` seconds. `fail(route, status, ...)` scripts error responses,
+    e.g. 429s with a Retry-After header, for the next `count` requests to a route. Requests per
+    route are counted in `requests` and timed in `request_times`.
+    """
+
+    def __init__(self, submissions, page_size=100, rate_limit=1000, window=10, host="127.0.0.1", port=0):
+        self.submissions = submissions
+        self.page_size = page_size
+        self.rate_limit = rate_limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.request_times = {}  # route -> time.monotonic() of each request
+        self.failures = []
+        self.window_started = time.monotonic()
+        self.used = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-reddit-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def fail(self, route, status, count=1, headers=None, match=None):
+        """Answers the next `count` requests to `route` (all of them if count is None) with `status`.
+
+        `match` optionally restricts the rule to paths containing that string.
+        """
+        with self.lock:
+            self.failures.append({"route": route, "status": status, "count": count, "headers": headers or {}, "match": match})
+
+    def rate_limit_headers(self):
+        """Counts a request against the current window and returns Reddit's rate-limit headers for it."""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_started >= self.window:
+                self.window_started, self.used = now, 0
+            self.used += 1
+            reset = max(1, int(self.window - (now - self.window_started)))
+            return {
+                "x-ratelimit-used": str(self.used),
+                "x-ratelimit-remaining": str(max(0, self.rate_limit - self.used)),
+                "x-ratelimit-reset": str(reset),
+            }
+
+    def _scripted_failure(self, route, path):
+        with self.lock:
+            for rule in self.failures:
+                if rule["route"] != route or (rule["match"] and rule["match"] not in path):
+                    continue
+                if rule["count"] is None:
+                    return rule
+                if rule["count"] > 0:
+                    rule["count"] -= 1
+                    return rule
+        return None
+
+    def _find(self, post_id):
+        for data in self.submissions:
+            if data["id"] == post_id:
+                return data
+        return None
+
+    @staticmethod
+    def _submission_thing(data):
+        return {"kind": "t3", "data": {
+            "id": data["id"],
+            "name": f"t3_{data['id']}",
+            "title": data.get("title", ""),
+            "subreddit": data.get("subreddit", ""),
+            "created_utc": data.get("created_utc", 0),
+            "score": data.get("score", 0),
+            "num_comments": len(data.get("comments", [])),
+            "author": "fake_user",
+            "permalink": f"/r/{data.get('subreddit', '')}/comments/{data['id']}/",
+        }}
+
+    @staticmethod
+    def _comment_thing(data, post_id):
+        return {"kind": "t1", "data": {
+            "id": data["id"],
+            "name": f"t1_{data['id']}",
+            "body": data["body"],
+            "created_utc": data.get("created_utc", 0),
+            "score": data.get("score", 0),
+            "author": "fake_user",
+            "parent_id": f"t3_{post_id}",
+            "link_id": f"t3_{post_id}",
+            "depth": 0,
+            "replies": "",
+        }}
+
+    @staticmethod
+    def _listing(children, after=None):
+        return {"kind": "Listing", "data": {"after": after, "before": None, "dist": len(children), "children": children}}
+
+    def search(self, subreddit, params):
+        terms = params.get("q", "").strip('"').lower()
+        posts = [
+            p for p in self.submissions
+            if (subreddit == "all" or p.get("subreddit", "").lower() == subreddit.lower())
+            and (terms in p.get("title", "").lower() or any(terms in c["body"].lower() for c in p.get("comments", [])))
+        ]
+        if params.get("sort") == "new":
+            posts.sort(key=lambda p: p.get("created_utc", 0), reverse=True)
+        elif params.get("sort") in ("top", "hot"):
+            posts.sort(key=lambda p: p.get("score", 0), reverse=True)
+
+        start = 0
+        if params.get("after"):
+            fullnames = [f"t3_{p['id']}" for p in posts]
+            start = fullnames.index(params["after"]) + 1 if params["after"] in fullnames else len(posts)
+        page = posts[start:start + min(int(params.get("limit", 25)), self.page_size)]
+        after = f"t3_{page[-1]['id']}" if page and start + len(page) < len(posts) else None
+        return 200, self._listing([self._submission_thing(p) for p in page], after)
+
+    def comments(self, post_id):
+        data = self._find(post_id)
+        if data is None:
+            return 404, {"message": "Not Found", "error": 404}
+        return 200, [
+            self._listing([self._submission_thing(data)]),
+            self._listing([self._comment_thing(c, post_id) for c in data.get("comments", [])]),
+        ]
+
+    def subreddit_names(self, form):
+        query = form.get("query", "").lower()
+        names = sorted({p.get("subreddit", "") for p in self.submissions})
+        if form.get("exact", "").lower() == "true":
+            if query not in {name.lower() for name in names}:
+                return 404, {"message": "Not Found", "error": 404}
+            return 200, {"names": [name for name in names if name.lower() == query]}
+        return 200, {"names": [name for name in names if query in name.lower()]}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass  # Keep check output readable
+
+            def _respond(self, status, payload, headers=None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=UTF-8")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in {**server.rate_limit_headers(), **(headers or {})}.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _dispatch(self, method):
+                parsed = urlparse(self.path)
+                params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+                for route_method, pattern, route in ROUTES:
+                    match = pattern.match(parsed.path)
+                    if route_method == method and match:
+                        break
+                else:
+                    return self._respond(404, {"message": "Not Found", "error": 404})
+
+                with server.lock:
+                    server.requests[route] += 1
+                    server.request_times.setdefault(route, []).append(time.monotonic())
+                failure = server._scripted_failure(route, parsed.path)
+                if failure is not None:
+                    return self._respond(failure["status"], {"message": "Scripted failure", "error": failure["status"]}, failure["headers"])
+
+                if route == "access_token":
+                    return self._respond(200, {"access_token": "fake-token", "token_type": "bearer", "expires_in": 3600, "scope": "*"})
+                if route == "search":
+                    return self._respond(*server.search(match["subreddit"], params))
+                if route == "comments":
+                    return self._respond(*server.comments(match["post_id"]))
+                length = int(self.headers.get("Content-Length", 0))
+                form = {key: values[-1] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+                return self._respond(*server.subreddit_names(form))
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+        return Handler
+
+
+# --- Scheduler checks -------------------------------------------------------------------------
+
+class UniformEncoder:
+    """Stands in for the SentenceTransformer so every comment counts as relevant."""
+
+    def encode(self, texts, **kwargs):
+        if isinstance(texts, str):
+            return [1.0, 1.0]
+        return [[1.0, 1.0] for _ in texts]
+
+
+def _fresh_scheduler():
+    import ratelimit
+    from getcomments import listing_cache
+    with ratelimit._scheduler_lock:
+        ratelimit._scheduler = ratelimit.RedditRequestScheduler()
+    listing_cache.clear()
+    return ratelimit._scheduler
+
+
+def _reddit(server):
+    import praw
+    return praw.Reddit(client_id="fake", client_secret="fake", user_agent="fakeserver checks",
+                       oauth_url=server.url, reddit_url=server.url)
+
+
+def check_pages_and_complete():
+    from getcomments import fetch_comments_with_semantic_filtering
+    with FakeRedditServer(build_submissions(12, 3), page_size=5) as server:
+        scheduler = _fresh_scheduler()
+        df = fetch_comments_with_semantic_filtering(_reddit(server), "pixel 8", UniformEncoder(), use_cache=False)
+        assert df.attrs["complete"] is True, "complete flag not set"
+        assert len(df) == 36, f"expected 36 comments, got {len(df)}"
+        assert server.requests["search"] == 3, f"expected 3 search pages, got {server.requests['search']}"
+        assert scheduler.stats["calls"] == 3 + 12, f"expected one token per page and per post, got {scheduler.stats['calls']}"
+
+
+def check_retry_after():
+    from getcomments import fetch_comments_with_semantic_filtering
+    with FakeRedditServer(build_submissions(4, 2)) as server:
+        server.fail("search", 429, count=2, headers={"Retry-After": "1"})
+        scheduler = _fresh_scheduler()
+        df = fetch_comments_with_semantic_filtering(_reddit(server), "pixel 8", UniformEncoder(), use_cache=False)
+        assert df.attrs["complete"] is True and len(df) == 8, "throttled fetch did not recover"
+        assert scheduler.stats["throttled"] == 2 and scheduler.stats["retries"] == 2, f"unexpected stats {scheduler.stats}"
+        times = server.request_times["search"]
+        waits = [later - earlier for earlier, later in zip(times, times[1:])][:2]
+        assert all(wait >= 1.0 for wait in waits), f"retried before Retry-After elapsed: {[round(w, 2) for w in waits]}s"
+
+
+def check_aimd():
+    from ratelimit import MAX_CONCURRENCY
+    with FakeRedditServer(build_submissions(1, 1)) as server:
+        reddit = _reddit(server)
+        scheduler = _fresh_scheduler()
+        server.fail("subreddit_names", 429, count=1, headers={"Retry-After": "0"})
+        scheduler.call(reddit.subreddits.search_by_name, "gadgets", exact=True, reddit=reddit)
+        after_throttle = scheduler.limit
+        assert after_throttle < MAX_CONCURRENCY / 2 + 1, f"limit not halved on 429: {after_throttle}"
+        for _ in range(10):
+            scheduler.call(reddit.subreddits.search_by_name, "gadgets", exact=True, reddit=reddit)
+        assert after_throttle < scheduler.limit <= MAX_CONCURRENCY, f"limit did not recover: {scheduler.limit}"
+
+
+def check_rate_limit_headers():
+    with FakeRedditServer(build_submissions(1, 1), rate_limit=120, window=60) as server:
+        reddit = _reddit(server)
+        scheduler = _fresh_scheduler()
+        scheduler.call(reddit.subreddits.search_by_name, "gadgets", exact=True, reddit=reddit)
+        limits = reddit.auth.limits
+        expected = limits["remaining"] / (limits["reset_timestamp"] - time.time())
+        assert abs(scheduler.bucket.rate - expected) < 0.25, f"bucket rate {scheduler.bucket.rate:.2f}, headers allow {expected:.2f}"
+
+
+def check_partial_results():
+    from getcomments import fetch_comments_with_semantic_filtering
+    with FakeRedditServer(build_submissions(6, 2)) as server:
+        server.fail("comments", 403, count=None, match="/comments/p3")
+        _fresh_scheduler()
+        df = fetch_comments_with_semantic_filtering(_reddit(server), "pixel 8", UniformEncoder(), use_cache=False)
+        assert df.attrs["complete"] is False, "complete flag not cleared on error"
+        assert len(df) == 6, f"expected the 6 comments fetched before the error, got {len(df)}"
+
+
+def check_adaptive_deadline():
+    from getcomments import fetch_and_analyze_adaptive
+    with FakeRedditServer(build_submissions(4, 2)) as server:
+        server.fail("search", 429, count=None, headers={"Retry-After": "30"})
+        _fresh_scheduler()
+        started = time.monotonic()
+        df = fetch_and_analyze_adaptive(_reddit(server), None, None, UniformEncoder(), "pixel 8",
+                                        scorer=lambda texts: [0.5] * len(texts), max_seconds=2)
+        elapsed = time.monotonic() - started
+        assert df.attrs["stop_reason"] == "time budget reached", f"stopped with {df.attrs['stop_reason']!r}"
+        assert elapsed < 3, f"time budget of 2s overrun: {elapsed:.1f}s"
+
+
+def check_crawl_budget_fallback():
+    from deepcrawl import DeepCrawler
+    from getcomments import fetch_comments_with_semantic_filtering
+    with FakeRedditServer(build_submissions(3, 2)) as server:
+        server.fail("comments", 429, count=1, headers={"Retry-After": "30"})
+        scheduler = _fresh_scheduler()
+        crawler = DeepCrawler(scheduler, max_seconds=2)
+        df = fetch_comments_with_semantic_filtering(_reddit(server), "pixel 8", UniformEncoder(), use_cache=False, crawler=crawler)
+        assert df.attrs["complete"] is True, "running out of crawl budget was reported as a fetch error"
+        assert len(df) == 6, f"expected all 6 comments via the plain fetch fallback, got {len(df)}"
+
+
+CHECKS = [check_pages_and_complete, check_retry_after, check_aimd, check_rate_limit_headers, check_partial_results,
+          check_adaptive_deadline, check_crawl_budget_fallback]
+
+
+def run_checks():
+    failed = 0
+    for check in CHECKS:
+        try:
+            check()
+            print(f"✅ {check.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {check.__name__}: {e}")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Reddit API server and request-scheduler checks.")
+    parser.add_argument("--serve", action="store_true", help="Serve synthetic data instead of running the checks")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate-limit", type=int, default=100, help="Requests per window reported in the headers")
+    parser.add_argument("--window", type=int, default=60, help="Rate-limit window in seconds")
+    args = parser.parse_args(argv)
+
+    if not args.serve:
+        return run_checks()
+
+    server = FakeRedditServer(build_submissions(50, 20), rate_limit=args.rate_limit, window=args.window, port=args.port)
+    print(f"Serving fake Reddit API at {server.url} (set OAUTH_URL and REDDIT_URL to it)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
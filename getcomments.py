@@ -3,7 +3,22 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 from sentence_transformers import SentenceTransformer
-from distilbert import clean_text_for_distilbert, analyze_sentiment_bert, extract_aspect_sentiment, PREDEFINED_ASPECTS
+from distilbert import clean_text_for_distilbert, analyze_sentiment_bert_batch, split_aspect_segments, aggregate_aspect_scores, PREDEFINED_ASPECTS
+from ratelimit import get_scheduler
+from commentstore import get_comment_store
+from results import compact_sentiment_frame
+from sampling import ConvergenceMonitor, SamplingBudget
+from cache import TTLCache
+import prawcore
+
+# Search listings change at different speeds depending on the sort order (seconds)
+LISTING_TTL = {"new": 2 * 60, "hot": 10 * 60, "relevance": 30 * 60, "top": 6 * 60 * 60}
+SUBREDDIT_EXISTS_TTL = 24 * 60 * 60
+SUBREDDIT_MISSING_TTL = 10 * 60
+
+# Shared by all sessions in the process
+listing_cache = TTLCache(max(LISTING_TTL.values()), max_entries=2000)  # (keyword, subreddit, sorting) -> post ids
+subreddit_cache = TTLCache(SUBREDDIT_EXISTS_TTL)  # subreddit name -> exists?
 
 def get_valid_keyword():
     keyword = st.text_input("Enter keyword to search for:", key="keyword_input").strip()
@@ -14,17 +29,32 @@ def get_valid_keyword():
     return None
 
 
+def subreddit_exists(reddit, subreddit):
+    """Checks a subreddit name against Reddit, caching the answer. Errors other than NotFound are raised and not cached."""
+    key = subreddit.lower()
+    exists = subreddit_cache.get(key)
+    if exists is not None:
+        return exists
+    try:
+        get_scheduler().call(reddit.subreddits.search_by_name, subreddit, exact=True, reddit=reddit)
+        exists = True
+    except prawcore.exceptions.NotFound:
+        exists = False
+    subreddit_cache.set(key, exists, ttl=SUBREDDIT_EXISTS_TTL if exists else SUBREDDIT_MISSING_TTL)
+    return exists
+
 def get_valid_subreddit(reddit):
     subreddit = st.text_input("Enter subreddit (leave blank for all):", key="subreddit_input").strip()
     if not subreddit:
         return None  # No subreddit = search all
 
     try:
-        reddit.subreddits.search_by_name(subreddit, exact=True)
-        return subreddit
+        if subreddit_exists(reddit, subreddit):
+            return subreddit
     except Exception:
-        st.error(f"❌ The subreddit '{subreddit}' does not exist or could not be verified.")
-        return None
+        pass
+    st.error(f"❌ The subreddit '{subreddit}' does not exist or could not be verified.")
+    return None
     
 # Function to get sentence embeddings
 def get_embedding(embedding_model, text):
@@ -41,6 +71,14 @@ def calculate_similarity(embedding_model, text1, text2):
     similarity = np.dot(embedding1, embedding2) / (np.linalg.norm(embedding1) * np.linalg.norm(embedding2))
     return similarity
 
+# Function to embed many texts in a single encode call and compare each with one reference embedding
+def embed_and_compare(embedding_model, texts, reference_embedding):
+    if not texts:
+        return np.empty((0, len(reference_embedding))), np.empty(0)
+    embeddings = np.asarray(embedding_model.encode(list(texts)))
+    norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(reference_embedding)
+    return embeddings, embeddings @ reference_embedding / norms
+
 def load_sentence_transformer():
     """Load and return the SentenceTransformer model with error handling."""
     try:
@@ -53,7 +91,88 @@ def load_sentence_transformer():
         st.error(f"❌ {error_message}")  # Display error in Streamlit
         return None
 
-def fetch_comments_with_semantic_filtering(reddit, keyword, embedding_model, subreddit=None, sorting='new', similarity_threshold=0.5):
+def get_post_comments(reddit, post, scheduler, store=None, comment_limit=20, deadline=None):
+    """Returns a post's first top-level comments as dicts, from the local store when fresh, otherwise from Reddit.
+
+    Raises TimeoutError if the request cannot be made before `deadline` (a `time.monotonic()` value).
+    """
+    if store is not None:
+        cached = store.get_comments(post.id)
+        if cached is not None:
+            return cached[:comment_limit]
+
+    scheduler.call(lambda: post.comments.replace_more(limit=0), reddit=reddit, deadline=deadline)  # Only fetch top-level comments
+    comments = [
+        {"id": c.id, "body": c.body, "created_utc": c.created_utc, "score": c.score}
+        for c in post.comments.list()[:comment_limit]  # Limit comments per post
+    ]
+
+    if store is not None:
+        store.put_comments(
+            {"id": post.id, "subreddit": str(post.subreddit), "title": post.title, "created_utc": post.created_utc},
+            comments
+        )
+    return comments
+
+POST_LIMIT = 500  # Number of posts to fetch
+COMMENT_LIMIT = 20  # Max comments per post
+
+def iter_relevant_comments(reddit, keyword, embedding_model, subreddit=None, sorting='new', similarity_threshold=0.5, store=None, crawler=None, deadline=None):
+    """Yields, post by post, the list of relevant cleaned comments ({"Timestamp", "Cleaned Comment", "Embedding"} dicts).
+
+    Only the first COMMENT_LIMIT top-level comments of each post are read, unless a `DeepCrawler` is
+    given, in which case reply threads are expanded within the crawler's budget. Errors from Reddit
+    are raised to the caller, which keeps whatever was yielded before. With a `deadline`
+    (a `time.monotonic()` value), Reddit requests that cannot start before it raise TimeoutError.
+    """
+    scheduler = get_scheduler()
+    keyword_embedding = get_embedding(embedding_model, keyword)
+    sort = sorting if sorting in ('new', 'hot', 'top') else 'relevance'  # Default to relevance
+    listing_key = (keyword.lower(), (subreddit or "all").lower(), sort)
+    cached_listing = listing_cache.get(listing_key)
+
+    if cached_listing is not None:
+        # Same search ran recently: skip the listing requests and start from the known posts
+        posts = (reddit.submission(id=post_id) for post_id in cached_listing)
+    else:
+        sub = reddit.subreddit(subreddit) if subreddit else reddit.subreddit("all")
+        posts = scheduler.iterate(sub.search(f'"{keyword}"', sort=sort, limit=POST_LIMIT), reddit=reddit, deadline=deadline)
+    listing = []
+
+    for post in posts:
+        if cached_listing is None:
+            listing.append(post.id)
+        top_comments = None
+        if crawler is not None and not crawler.exhausted():
+            try:
+                top_comments = crawler.crawl(reddit, post, lambda texts: embed_and_compare(embedding_model, texts, keyword_embedding))
+                embeddings = [c["embedding"] for c in top_comments]
+                similarities = [c["similarity"] for c in top_comments]
+            except TimeoutError:
+                top_comments = None  # Crawl budget ran out before the tree could be loaded; read this post normally
+        if top_comments is None:
+            top_comments = get_post_comments(reddit, post, scheduler, store, COMMENT_LIMIT, deadline)
+            embeddings, similarities = embed_and_compare(embedding_model, [c["body"] for c in top_comments], keyword_embedding)
+
+        post_comments = []
+        for comment, embedding, similarity in zip(top_comments, embeddings, similarities):
+            if similarity > similarity_threshold:
+                cleaned_text = clean_text_for_distilbert(comment["body"])
+
+                if cleaned_text:
+                    # Add relevant comment info (timestamp, cleaned text)
+                    post_comments.append({
+                        "Timestamp": pd.to_datetime(comment["created_utc"], unit='s'),
+                        "Cleaned Comment": cleaned_text,
+                        "Embedding": embedding  # Kept for embedding-based aspect detection, dropped from the results
+                    })
+        yield post_comments
+
+    # Only a fully read listing is cached; a caller stopping early never reaches this point
+    if cached_listing is None:
+        listing_cache.set(listing_key, listing, ttl=LISTING_TTL[sort])
+
+def fetch_comments_with_semantic_filtering(reddit, keyword, embedding_model, subreddit=None, sorting='new', similarity_threshold=0.5, use_cache=True, crawler=None):
     """Fetches comments from Reddit, filters based on semantic similarity with the keyword, and returns cleaned comment data.
 
     Args:
@@ -63,108 +182,186 @@ def fetch_comments_with_semantic_filtering(reddit, keyword, embedding_model, sub
         subreddit: The name of the subreddit (optional). If None, searches across all of Reddit.
         sorting: The sorting method for posts ('new', 'hot', 'top', 'relevance'). Defaults to 'new'.
         similarity_threshold: The minimum semantic similarity score for a comment to be included.
+        use_cache: Reuse recently downloaded comments from the local comment store. Defaults to True.
+        crawler: Optional DeepCrawler to expand reply threads beyond the top-level comments, within its budget.
 
     Returns:
-        pd.DataFrame: DataFrame with filtered and cleaned comments and their timestamps.
+        pd.DataFrame: DataFrame with filtered and cleaned comments, their timestamps and sentence embeddings.
+            `df.attrs["complete"]` is False if fetching stopped early on an error, in which
+            case the comments gathered so far are still returned.
     """
-    POST_LIMIT = 500  # Number of posts to fetch
-    COMMENT_LIMIT = 20  # Max comments per post
-
     if not keyword.strip():
         print("Error: Keyword cannot be empty. Please enter a valid search term.")
         return pd.DataFrame()
 
     comments_data = []
+    complete = True
+    store = get_comment_store() if use_cache else None
 
     try:
-        sub = reddit.subreddit(subreddit) if subreddit else reddit.subreddit("all")
-
-        if sorting == 'new':
-            search = sub.search(f'"{keyword}"', sort="new", limit=POST_LIMIT)
-        elif sorting == 'hot':
-            search = sub.search(f'"{keyword}"', sort="hot", limit=POST_LIMIT)
-        elif sorting == 'top':
-            search = sub.search(f'"{keyword}"', sort="top", limit=POST_LIMIT)
-        else:  # Default to relevance
-            search = sub.search(f'"{keyword}"', sort="relevance", limit=POST_LIMIT)
-
-        for post in search:
-            post.comments.replace_more(limit=0)  # Only fetch top-level comments
-            top_comments = post.comments.list()[:COMMENT_LIMIT]  # Limit comments per post
-
-            for comment in top_comments:
-                similarity = calculate_similarity(embedding_model, comment.body, keyword)
-
-                if similarity > similarity_threshold:
-                    cleaned_text = clean_text_for_distilbert(comment.body)
-
-                    if cleaned_text:
-                        # Add relevant comment info (timestamp, cleaned text)
-                        comments_data.append({
-                            "Timestamp": pd.to_datetime(comment.created_utc, unit='s'),
-                            "Cleaned Comment": cleaned_text
-                        })
+        for post_comments in iter_relevant_comments(reddit, keyword, embedding_model, subreddit, sorting, similarity_threshold, store, crawler):
+            comments_data.extend(post_comments)
 
     except Exception as e:
-        print(f"Error fetching comments: {e}")
-        return pd.DataFrame()
+        print(f"Error fetching comments, returning {len(comments_data)} comments gathered so far: {e}")
+        complete = False
+
+    if store is not None:
+        store.maybe_compact()
 
     # Return DataFrame with filtered comments
     df_comments = pd.DataFrame(comments_data)
+    df_comments.attrs["complete"] = complete
+    if crawler is not None:
+        df_comments.attrs["crawl_coverage"] = crawler.coverage
 
     return df_comments
 
-def fetch_and_analyze_sentiment(reddit, tokenizer, model, embedding_model, keyword, subreddit=None, sorting='new', similarity_threshold=0.5):
+def fetch_and_analyze_sentiment(reddit, tokenizer, model, embedding_model, keyword, subreddit=None, sorting='new', similarity_threshold=0.5, scorer=None, aspect_classifier=None, crawler=None):
     """Fetches and analyzes sentiment using both semantic filtering and aspect-based sentiment analysis."""
 
     print(f"Fetching comments with semantic filtering (sorted by '{sorting}')...")
-    df_comments = fetch_comments_with_semantic_filtering(reddit, keyword, embedding_model, subreddit, sorting, similarity_threshold)
+    df_comments = fetch_comments_with_semantic_filtering(reddit, keyword, embedding_model, subreddit, sorting, similarity_threshold, crawler=crawler)
     print("✅ Done fetching comments")
 
-    if df_comments.empty:
-        print("❌ No relevant comments found after filtering.")
-        return pd.DataFrame()  # Return empty DataFrame if no comments
+    df_sentiment = analyze_comments(tokenizer, model, df_comments, scorer, aspect_classifier)
+    if crawler is not None:
+        df_sentiment.attrs["crawl_coverage"] = crawler.coverage
+    return df_sentiment
 
-    # Analyze sentiment for each cleaned comment using the BERT model
-    sentiment_data = []
-
-    # Define the columns for aspect sentiment based on your predefined aspects
-    predefined_aspects = list(PREDEFINED_ASPECTS.keys())  # Get the aspect names
-    print("✅ Predefined aspects retrieved")
+def analyze_comments(tokenizer, model, df_comments, scorer=None, aspect_classifier=None):
+    """Scores overall and aspect-based sentiment for a frame of fetched, cleaned comments.
 
-    for _, row in df_comments.iterrows():
-        cleaned_comment = row["Cleaned Comment"]
+    All comments and aspect segments are scored in batched forward passes. `scorer` maps a
+    list of texts to scaled scores; it defaults to running DistilBERT directly and can be
+    swapped for the shared inference service.
 
-        # Analyze sentiment using the DistilBERT model
-        print(f"Analyzing sentiment for comment: {cleaned_comment[:50]}...")  # Print a preview
-        sentiment_score = analyze_sentiment_bert(tokenizer, model, cleaned_comment)
+    If an `aspect_classifier` is given and the frame has an "Embedding" column, aspects the
+    comment's embedding matches but no keyword hit found (paraphrases) are also recorded,
+    using the comment's overall score, so no extra encoder or DistilBERT calls are made. How
+    many such mentions were added is recorded in `attrs["embedding_aspects_added"]`.
+    """
 
-        # Ensure sentiment_score is a scalar value (extract from NumPy array if needed)
-        if isinstance(sentiment_score, list):
-            sentiment_score = sentiment_score[0]  # Extract from list (as you had)
-        elif isinstance(sentiment_score, np.ndarray):
-            sentiment_score = sentiment_score.item()  # Extract the scalar from NumPy array
+    if df_comments.empty:
+        print("❌ No relevant comments found after filtering.")
+        df_empty = pd.DataFrame()  # Return empty DataFrame if no comments
+        df_empty.attrs["complete"] = df_comments.attrs.get("complete", True)
+        return df_empty
 
-        print(f"✅ Sentiment score calculated: {sentiment_score}")
+    if scorer is None:
+        scorer = lambda texts: analyze_sentiment_bert_batch(tokenizer, model, texts)
 
-        # Extract aspect-based sentiment for the comment
-        aspect_sentiment = extract_aspect_sentiment(tokenizer, model, cleaned_comment)
-        print(f"✅ Aspect sentiment extracted: {aspect_sentiment}")
+    # Define the columns for aspect sentiment based on your predefined aspects
+    predefined_aspects = list(PREDEFINED_ASPECTS.keys())  # Get the aspect names
+    cleaned_comments = df_comments["Cleaned Comment"].tolist()
+
+    # Analyze overall sentiment for every comment using the BERT model
+    print(f"Analyzing sentiment for {len(cleaned_comments)} comments...")
+    sentiment_scores = scorer(cleaned_comments)
+    print("✅ Sentiment scores calculated")
+
+    # Split every comment into aspect segments and score all segments together
+    comment_segments = [split_aspect_segments(comment) for comment in cleaned_comments]
+    all_segments = [segment for segments in comment_segments for segment, _ in segments]
+    segment_scores = scorer(all_segments)
+    print(f"✅ Aspect sentiment extracted from {len(all_segments)} segments")
+
+    # Aspects matched by the comment embeddings (one matrix multiply for the whole frame)
+    if aspect_classifier is not None and "Embedding" in df_comments.columns:
+        embedding_aspects = aspect_classifier.detect(np.stack(df_comments["Embedding"].to_numpy()))
+    else:
+        embedding_aspects = [[] for _ in cleaned_comments]
 
-        # Add the aspect sentiments into individual columns
-        aspect_sentiments_row = {aspect: aspect_sentiment.get(aspect, None) for aspect in predefined_aspects}
-        print("✅ Aspect sentiments mapped")
+    sentiment_data = []
+    offset = 0
+    paraphrased_count = 0
+    for timestamp, cleaned_comment, segments, sentiment_score, matched_aspects in zip(
+            df_comments["Timestamp"], cleaned_comments, comment_segments, sentiment_scores, embedding_aspects):
+        scores = list(segment_scores[offset:offset + len(segments)])
+        offset += len(segments)
+
+        keyword_aspects = {aspect for _, aspects in segments for aspect in aspects}
+        paraphrased_aspects = [aspect for aspect in matched_aspects if aspect not in keyword_aspects]
+        if paraphrased_aspects:
+            paraphrased_count += len(paraphrased_aspects)
+            segments = segments + [(cleaned_comment, paraphrased_aspects)]
+            scores.append(sentiment_score)
+
+        aspect_sentiment = aggregate_aspect_scores(segments, scores)
 
         sentiment_data.append({
-            "Timestamp": row["Timestamp"],
+            "Timestamp": timestamp,
             "Cleaned Comment": cleaned_comment,
-            "Sentiment Score": sentiment_score,
-            **aspect_sentiments_row  # Add aspect sentiment columns dynamically
+            "Sentiment Score": float(sentiment_score),
+            **{aspect: aspect_sentiment.get(aspect, None) for aspect in predefined_aspects}  # Add aspect sentiment columns dynamically
         })
-        print("✅ Comment processing complete")
 
     # Return a DataFrame with sentiment analysis results, including separate columns for each aspect's sentiment
-    df_sentiment = pd.DataFrame(sentiment_data)
+    df_sentiment = compact_sentiment_frame(pd.DataFrame(sentiment_data), predefined_aspects)
+    df_sentiment.attrs["complete"] = df_comments.attrs.get("complete", True)
+    df_sentiment.attrs["embedding_aspects_added"] = paraphrased_count
+    if aspect_classifier is not None:
+        print(f"✅ Embedding aspect detection added {paraphrased_count} aspect mentions not matched by keywords")
     print("✅ DataFrame created successfully")
 
-    return df_sentiment
\ No newline at end of file
+    return df_sentiment
+
+
+def fetch_and_analyze_adaptive(reddit, tokenizer, model, embedding_model, keyword, subreddit=None, sorting='new', similarity_threshold=0.5,
+                               scorer=None, aspect_classifier=None, precision=0.02, aspect_precision=None, confidence=0.95, max_seconds=None, max_comments=None,
+                               crawler=None):
+    """Fetches and scores comments post by post, stopping once the mean sentiment estimate has converged.
+
+    Stops when the confidence interval half-width of the overall mean (and of well-sampled aspects, if
+    `aspect_precision` is set) drops to `precision`, when `max_seconds` or `max_comments` is reached, or
+    when the posts run out. The returned frame carries `attrs["confidence_intervals"]` and `attrs["stop_reason"]`.
+    """
+    monitor = ConvergenceMonitor(PREDEFINED_ASPECTS.keys(), precision, aspect_precision, confidence)
+    budget = SamplingBudget(max_seconds, max_comments)
+    store = get_comment_store()
+    frames = []
+    scored = 0
+    complete = True
+    stop_reason = "all posts fetched"
+
+    print(f"Fetching comments adaptively (sorted by '{sorting}', precision ±{precision})...")
+    if crawler is not None and budget.deadline is not None:
+        crawler.deadline = min(crawler.deadline, budget.deadline)
+    posts = iter_relevant_comments(reddit, keyword, embedding_model, subreddit, sorting, similarity_threshold, store, crawler, budget.deadline)
+    try:
+        for post_comments in posts:
+            if post_comments:
+                df_post = analyze_comments(tokenizer, model, pd.DataFrame(post_comments), scorer, aspect_classifier)
+                frames.append(df_post)
+                monitor.update_frame(df_post)
+                scored += len(df_post)
+
+            if monitor.converged():
+                stop_reason = "estimate converged"
+                break
+            exhausted = budget.exhausted(scored)
+            if exhausted:
+                stop_reason = exhausted
+                break
+    except TimeoutError:
+        # A rate-limit wait or retry would have run past max_seconds
+        stop_reason = "time budget reached"
+    except Exception as e:
+        print(f"Error fetching comments, returning {scored} comments gathered so far: {e}")
+        complete = False
+        stop_reason = "fetch error"
+    finally:
+        posts.close()
+
+    store.maybe_compact()
+    print(f"✅ Stopped after {scored} comments: {stop_reason}")
+
+    df_sentiment = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    df_sentiment.attrs["complete"] = complete
+    df_sentiment.attrs["stop_reason"] = stop_reason
+    df_sentiment.attrs["confidence"] = confidence
+    df_sentiment.attrs["confidence_intervals"] = monitor.intervals()
+    df_sentiment.attrs["embedding_aspects_added"] = sum(frame.attrs.get("embedding_aspects_added", 0) for frame in frames)
+    if crawler is not None:
+        df_sentiment.attrs["crawl_coverage"] = crawler.coverage
+    return df_sentiment
@@ -0,0 +1,221 @@
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from distilbert import load_distilbert, analyze_sentiment_bert_batch, CascadeScorer
+from getcomments import load_sentence_transformer
+from aspects import AspectClassifier
+
+MAX_BATCH_SIZE = 64
+MAX_WAIT = 0.01  # Seconds the first request in a batch waits for others to join
+LATENCY_WINDOW = 1000
+
+
+class _Request:
+    """One `submit` call, split into chunks of at most `max_batch_size` items."""
+
+    def __init__(self, items, chunk_size):
+        self.chunks = deque((start, items[start:start + chunk_size]) for start in range(0, len(items), chunk_size))
+        self.unfinished = len(self.chunks)
+        self.results = [None] * len(items)
+        self.future = Future()
+        self.submitted = time.monotonic()
+
+
+class MicroBatcher:
+    """Collects items submitted from many threads into batches for a single `batch_fn` call.
+
+    Each submission is split into chunks of at most `max_batch_size` items, and chunks are
+    taken from the waiting submissions round-robin, so a large submission cannot hold up a
+    small one for more than one batch per submission ahead of it. A batch is dispatched when
+    it reaches `max_batch_size` items or when its oldest request has waited `max_wait`
+    seconds, whichever comes first. `batch_fn` takes a list of items and returns a sequence
+    of results in the same order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT, name="batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.pending = deque()  # Requests with chunks left to dispatch, served round-robin
+        self.cond = threading.Condition()
+        self.metrics_lock = threading.Lock()
+        self.batch_sizes = Counter()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self.worker.start()
+
+    def submit(self, items):
+        """Queues a list of items and returns a Future resolving to their results (as a list)."""
+        items = list(items)
+        if not items:
+            future = Future()
+            future.set_result([])
+            return future
+        request = _Request(items, self.max_batch_size)
+        with self.cond:
+            self.pending.append(request)
+            self.cond.notify()
+        return request.future
+
+    def __call__(self, items):
+        return self.submit(items).result()
+
+    def _take_chunks(self, batch, size):
+        # Called with self.cond held: adds whole chunks round-robin while they fit in the batch
+        while self.pending and size < self.max_batch_size:
+            request = self.pending[0]
+            start, chunk = request.chunks[0]
+            if size and size + len(chunk) > self.max_batch_size:
+                break
+            request.chunks.popleft()
+            self.pending.popleft()
+            if request.chunks:
+                self.pending.append(request)
+            batch.append((request, start, chunk))
+            size += len(chunk)
+        return size
+
+    def _collect(self):
+        with self.cond:
+            while not self.pending:
+                self.cond.wait()
+            deadline = self.pending[0].submitted + self.max_wait
+            batch = []
+            size = self._take_chunks(batch, 0)
+            # Wait for more only while nothing already queued is left out for lack of room
+            while size < self.max_batch_size and not self.pending:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                self.cond.wait(timeout)
+                size = self._take_chunks(batch, size)
+        return batch, size
+
+    def _fail(self, request, exc):
+        with self.cond:
+            if request in self.pending:
+                self.pending.remove(request)
+        if not request.future.done():
+            request.future.set_exception(exc)
+
+    def _run(self):
+        while True:
+            batch, size = self._collect()
+            items = [item for _, _, chunk in batch for item in chunk]
+            try:
+                results = list(self.batch_fn(items))
+            except Exception as e:
+                for request, _, _ in batch:
+                    self._fail(request, e)
+                continue
+
+            now = time.monotonic()
+            offset = 0
+            for request, start, chunk in batch:
+                request.results[start:start + len(chunk)] = results[offset:offset + len(chunk)]
+                offset += len(chunk)
+                request.unfinished -= 1
+                if request.unfinished == 0 and not request.future.done():
+                    request.future.set_result(request.results)
+                    with self.metrics_lock:
+                        self.latencies.append(now - request.submitted)
+            with self.metrics_lock:
+                self.batch_sizes[size] += 1
+
+    def metrics(self):
+        """Returns queue depth (items waiting), batch-size histogram and request latency percentiles (seconds)."""
+        with self.metrics_lock:
+            latencies = np.array(self.latencies)
+            histogram = dict(sorted(self.batch_sizes.items()))
+        with self.cond:
+            queue_depth = sum(len(chunk) for request in self.pending for _, chunk in request.chunks)
+        metrics = {"queue_depth": queue_depth, "batch_sizes": histogram}
+        if len(latencies):
+            metrics.update({f"latency_p{p}": float(np.percentile(latencies, p)) for p in (50, 95, 99)})
+        return metrics
+
+
+class BatchedEmbeddingModel:
+    """Drop-in for SentenceTransformer's `encode` that routes through a shared MicroBatcher."""
+
+    def __init__(self, embedding_model, batcher):
+        self.embedding_model = embedding_model
+        self.batcher = batcher
+
+    def encode(self, sentences, **kwargs):
+        if isinstance(sentences, str):
+            return self.batcher([sentences])[0]
+        return np.array(self.batcher(list(sentences)))
+
+
+class InferenceService:
+    """Process-wide owner of the DistilBERT classifier and the SentenceTransformer.
+
+    Requests from all sessions are merged into micro-batches so concurrent analyses
+    share forward passes instead of each running tiny ones.
+    """
+
+    def __init__(self, tokenizer, model, embedding_model, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT, cascade_threshold=None,
+                 embedding_aspects=False):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.sentiment_batcher = MicroBatcher(
+            lambda texts: analyze_sentiment_bert_batch(tokenizer, model, texts, batch_size=max_batch_size),
+            max_batch_size, max_wait, name="sentiment-batcher"
+        )
+        self.embedding_batcher = MicroBatcher(
+            lambda texts: embedding_model.encode(texts, batch_size=max_batch_size),
+            max_batch_size, max_wait, name="embedding-batcher"
+        )
+        self.embedding_model = BatchedEmbeddingModel(embedding_model, self.embedding_batcher)
+        # Embedding aspect detection, off by default: its similarity threshold has not been validated on
+        # labelled comments yet. Keyword prototypes are embedded once, at startup.
+        self.aspect_classifier = AspectClassifier(embedding_model) if embedding_aspects else None
+        # Lexicon-first cascade, off by default: the seed lexicon is uncalibrated, so only enable it with a
+        # threshold tuned offline (`python distilbert.py <fixture file>`). It switches itself off if audits disagree.
+        self.cascade = CascadeScorer(self.score_full, threshold=cascade_threshold) if cascade_threshold is not None else None
+
+    def score(self, texts):
+        """Scaled sentiment scores for `texts`, as a NumPy array. Confident texts are answered by the lexicon cascade."""
+        if self.cascade is not None:
+            return self.cascade(texts)
+        return self.score_full(texts)
+
+    def score_full(self, texts):
+        """Scaled DistilBERT sentiment scores for `texts`, as a NumPy array."""
+        return np.array(self.sentiment_batcher(texts), dtype=float)
+
+    def encode(self, texts):
+        return self.embedding_model.encode(texts)
+
+    def metrics(self):
+        metrics = {"sentiment": self.sentiment_batcher.metrics(), "embedding": self.embedding_batcher.metrics()}
+        if self.cascade is not None:
+            metrics["cascade"] = self.cascade.metrics()
+        return metrics
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_inference_service(cascade_threshold=None, embedding_aspects=False):
+    """Returns the shared inference service, loading the models on first use.
+
+    `cascade_threshold` enables the lexicon cascade and `embedding_aspects` the embedding aspect
+    classifier (see `InferenceService`); like the models, they are fixed by the first call in the process.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            tokenizer, model = load_distilbert()
+            embedding_model = load_sentence_transformer()
+            if embedding_model is None:
+                raise RuntimeError("SentenceTransformer could not be loaded.")
+            _service = InferenceService(tokenizer, model, embedding_model, cascade_threshold=cascade_threshold,
+                                        embedding_aspects=embedding_aspects)
+        return _service
@@ -0,0 +1,220 @@
+"""Concurrent-session load test for the Streamlit app.
+
+Usage:
+    python loadtest.py --sessions 1 2 4 8 [--iterations 2] [--keyword "pixel 8"] [--max-p95 10]
+
+Each simulated session goes through register -> login -> run analysis -> pick a
+sentiment category in the aspect contribution chart -> open History, driven by
+Streamlit's AppTest. Reddit is served from a recording (synthetic unless
+--fake-reddit is given) and Firestore from the in-memory fake, so no network
+access or credentials are needed. The models are real and shared by all sessions.
+
+For each concurrency level the throughput (flows/s), p50/p95/p99 latency per page
+interaction and memory per session are printed and written to --output as JSON.
+With --max-p95 the exit status is non-zero if any level's p95 exceeds the limit,
+so the run can be used as a regression gate.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+FIXTURE_COMMENTS = os.path.join("fixtures", "cascade_comments.txt")
+PAGE_TIMEOUT = 600
+
+
+def build_synthetic_recording(keyword, n_posts=30, comments_per_post=20, seed=0):
+    """Writes a FakeReddit recording whose posts all match `keyword`, with comments drawn from the fixture set."""
+    rng = random.Random(seed)
+    with open(FIXTURE_COMMENTS, encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    now = int(time.time())
+    submissions = [{
+        "id": f"load{i}",
+        "title": f"Thoughts on the {keyword}?",
+        "subreddit": "gadgets",
+        "created_utc": now - i * 3600,
+        "score": rng.randint(0, 500),
+        "comments": [{
+            "id": f"load{i}c{j}",
+            "body": f"The {keyword}: {rng.choice(lines)}",
+            "created_utc": now - i * 3600 + j * 60,
+            "score": rng.randint(-5, 200),
+        } for j in range(comments_per_post)],
+    } for i in range(n_posts)]
+    handle, path = tempfile.mkstemp(suffix=".json", prefix="fake_reddit_")
+    with os.fdopen(handle, "w", encoding="utf-8") as f:
+        json.dump(submissions, f)
+    return path
+
+
+def rss_bytes():
+    """Current resident set size of this process (Linux), or peak RSS elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def find(elements, label):
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f"No widget labelled {label!r}")
+
+
+class Session:
+    """One simulated user. Every AppTest.run() is timed as a page interaction."""
+
+    def __init__(self, secrets, keyword, latencies):
+        self.secrets = secrets
+        self.keyword = keyword
+        self.latencies = latencies
+        self.result_bytes = 0
+
+    def _app(self, path):
+        at = AppTest.from_file(path, default_timeout=PAGE_TIMEOUT)
+        for section, values in self.secrets.items():
+            at.secrets[section] = values
+        return at
+
+    def _run(self, step, action):
+        started = time.perf_counter()
+        at = action()
+        self.latencies.setdefault(step, []).append(time.perf_counter() - started)
+        if at.exception:
+            raise RuntimeError(f"{step} raised: {at.exception[0].message}")
+        return at
+
+    def flow(self):
+        username = f"load_{uuid.uuid4().hex[:10]}"
+        password = "load-test-password"
+        at = self._app("Analyse.py")
+        self._run("landing", at.run)
+
+        self._run("open register", lambda: find(at.radio, "Login or Register?").set_value("Register").run())
+        find(at.text_input, "Username").input(username)
+        find(at.text_input, "Email Address").input(f"{username}@example.com")
+        find(at.text_input, "Password").input(password)
+        self._run("register", lambda: find(at.button, "Register").click().run())
+
+        self._run("open login", lambda: find(at.radio, "Login or Register?").set_value("Login").run())
+        find(at.text_input, "Username").input(username)
+        find(at.text_input, "Password").input(password)
+        self._run("login", lambda: find(at.button, "Login").click().run())
+
+        find(at.text_input, "🔍 Enter keyword to search for:").input(self.keyword)
+        self._run("run analysis", lambda: find(at.button, "Run Analysis").click().run())
+        df = at.session_state["df_comments"]
+        self.result_bytes = int(df.memory_usage(deep=True).sum()) if not df.empty else 0
+
+        try:
+            category = find(at.selectbox, "Select a Sentiment Category:")
+            options = list(category.options)
+            if len(options) > 1:
+                self._run("aspect contribution", lambda: category.select(options[-1]).run())
+        except LookupError:
+            pass  # Not enough aspect mentions to draw the chart
+
+        history = self._app(os.path.join("pages", "History.py"))
+        history.session_state["logged_in"] = True
+        history.session_state["user"] = at.session_state["user"]
+        self._run("history", history.run)
+
+
+def run_level(n_sessions, iterations, secrets, keyword):
+    latencies = {}
+    lock = threading.Lock()
+    result_bytes = []
+    errors = []
+
+    def worker(_):
+        for _ in range(iterations):
+            session_latencies = {}
+            session = Session(secrets, keyword, session_latencies)
+            try:
+                session.flow()
+            except Exception as e:
+                errors.append(str(e))
+            with lock:
+                for step, values in session_latencies.items():
+                    latencies.setdefault(step, []).extend(values)
+                result_bytes.append(session.result_bytes)
+
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_sessions) as pool:
+        list(pool.map(worker, range(n_sessions)))
+    elapsed = time.perf_counter() - started
+    rss_after = rss_bytes()
+
+    all_latencies = np.array([value for values in latencies.values() for value in values])
+    flows = n_sessions * iterations - len(errors)
+    return {
+        "sessions": n_sessions,
+        "flows": flows,
+        "errors": errors,
+        "throughput_flows_per_s": flows / elapsed if elapsed else 0.0,
+        "latency_s": {f"p{p}": float(np.percentile(all_latencies, p)) for p in (50, 95, 99)} if len(all_latencies) else {},
+        "latency_by_step_s": {
+            step: {f"p{p}": float(np.percentile(values, p)) for p in (50, 95, 99)} for step, values in latencies.items()
+        },
+        "rss_growth_per_session_mb": (rss_after - rss_before) / n_sessions / 2**20,
+        "result_frame_mb": float(np.mean(result_bytes)) / 2**20 if result_bytes else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit app with concurrent simulated sessions.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8], help="Concurrency levels to test")
+    parser.add_argument("--iterations", type=int, default=1, help="Flows per session at each level")
+    parser.add_argument("--keyword", default="pixel 8")
+    parser.add_argument("--fake-reddit", help="FakeReddit recording to serve (defaults to a synthetic one)")
+    parser.add_argument("--output", default="loadtest_results.json")
+    parser.add_argument("--max-p95", type=float, help="Fail if the overall p95 page latency (s) exceeds this at any level")
+    args = parser.parse_args(argv)
+
+    recording = args.fake_reddit or build_synthetic_recording(args.keyword)
+    secrets = {
+        "firestore": {"backend": "memory"},
+        "reddit": {"FAKE_DATA": recording, "CLIENT_ID": "", "CLIENT_SECRET": "", "USER_AGENT": "loadtest"},
+    }
+
+    # Warm-up flow so model loading is not attributed to the first level
+    print("Warming up (loading models)...")
+    Session(secrets, args.keyword, {}).flow()
+
+    results = []
+    for n_sessions in args.sessions:
+        result = run_level(n_sessions, args.iterations, secrets, args.keyword)
+        results.append(result)
+        latency = result["latency_s"]
+        print(f"{n_sessions:>3} sessions: {result['throughput_flows_per_s']:.3f} flows/s, "
+              f"p50 {latency.get('p50', float('nan')):.2f}s p95 {latency.get('p95', float('nan')):.2f}s "
+              f"p99 {latency.get('p99', float('nan')):.2f}s, {result['rss_growth_per_session_mb']:.1f} MB/session, "
+              f"{len(result['errors'])} errors")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    if args.max_p95 is not None:
+        slow = [r["sessions"] for r in results if r["latency_s"].get("p95", 0) > args.max_p95]
+        if slow:
+            print(f"❌ p95 latency above {args.max_p95}s at {slow} sessions")
+            return 1
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,10 @@
 import streamlit as st
-from auth import get_user_history 
+from auth import get_user_history, load_history_data
 import pandas as pd
 from report import get_colour, map_sentiment_to_label
 import plotly.graph_objects as go
+from distilbert import PREDEFINED_ASPECTS
+from trends import get_trend_store, normalise_keyword, OVERALL
 
 st.title("Your Analysis History")
 
@@ -22,9 +24,8 @@ if 'logged_in' in st.session_state and st.session_state['logged_in'] and 'user'
 
             st.markdown(f"**Timestamp:** {timestamp_str}  \n**Keyword:** `{keyword_str}`  \n**Subreddit:** `{subreddit_str}`  \n**Sorting:** `{sorting_str}`")
 
-            if 'data' in item:
-                df_history_item = pd.DataFrame(item['data'])
-
+            df_history_item = load_history_data(item)
+            if df_history_item is not None:
                 # General sentiment
                 if "Sentiment Score" in df_history_item.columns:
                     avg_sentiment = df_history_item["Sentiment Score"].mean()
@@ -39,10 +40,12 @@ if 'logged_in' in st.session_state and st.session_state['logged_in'] and 'user'
 
                 # Aspect-based sentiment
                 ignored_cols = ['timestamp', 'Sentiment Score', 'Cleaned Comment', 'Comment', 'Sentiment Label']
-                aspect_cols = [col for col in df_history_item.columns if col not in ignored_cols and df_history_item[col].dtype in ['float64', 'int64']]
+                aspect_cols = [col for col in df_history_item.columns if col not in ignored_cols and pd.api.types.is_numeric_dtype(df_history_item[col]) and not pd.api.types.is_bool_dtype(df_history_item[col])]
+                # Aspects nobody mentioned load back from Parquet as all-null numeric columns; skip them
+                aspect_cols = [col for col in aspect_cols if df_history_item[col].notna().any()]
 
                 if aspect_cols:
-                    aspect_avg = df_history_item[aspect_cols].mean().reset_index()
+                    aspect_avg = df_history_item[aspect_cols].mean().dropna().astype(float).reset_index()
                     aspect_avg.columns = ['Aspect', 'Average Score']
                     aspect_avg['Sentiment Label'] = aspect_avg['Average Score'].apply(map_sentiment_to_label)
                     aspect_avg['Color'] = aspect_avg['Average Score'].apply(get_colour)
@@ -77,5 +80,36 @@ if 'logged_in' in st.session_state and st.session_state['logged_in'] and 'user'
             st.markdown("---")
     else:
         st.info("You haven't performed any analyses yet.")
+
+    # Sentiment trends over time, read from the pre-aggregated buckets rather than the stored comments.
+    # The store is shared by all users, so only keywords this user has analysed are offered.
+    trend_store = get_trend_store()
+    user_keywords = {normalise_keyword(item['keyword']) for item in history_data or [] if item.get('keyword')}
+    trend_keywords = [keyword for keyword in trend_store.keywords() if keyword in user_keywords]
+    if trend_keywords:
+        st.subheader("Sentiment Trends")
+        trend_col1, trend_col2 = st.columns(2)
+        with trend_col1:
+            trend_keyword = st.selectbox("Keyword:", trend_keywords)
+        with trend_col2:
+            granularity = st.radio("Granularity:", ["day", "hour"], horizontal=True)
+        trend_aspects = st.multiselect("Aspects:", [OVERALL] + list(PREDEFINED_ASPECTS.keys()), default=[OVERALL])
+
+        df_trend = trend_store.trend(trend_keyword, granularity, trend_aspects)
+        if df_trend.empty:
+            st.info("No trend data for the selected aspects yet.")
+        else:
+            trend_fig = go.Figure()
+            for aspect, df_aspect in df_trend.groupby("Aspect"):
+                trend_fig.add_trace(go.Scatter(
+                    x=df_aspect["Bucket"],
+                    y=df_aspect["Mean"],
+                    mode="lines+markers",
+                    name=aspect,
+                    customdata=df_aspect["Count"],
+                    hovertemplate="%{x}<br>Average: %{y:.2f}<br>Comments: %{customdata}"
+                ))
+            trend_fig.update_layout(yaxis=dict(range=[0, 1], title="Average Sentiment"), xaxis_title="Comment time")
+            st.plotly_chart(trend_fig, use_container_width=True, key="sentiment_trend")
 else:
     st.info("Please log in to view your analysis history.")
@@ -0,0 +1,219 @@
+import random
+import threading
+import time
+import weakref
+import prawcore
+
+# Reddit allows 100 queries per minute for an OAuth client
+DEFAULT_RATE = 100 / 60
+DEFAULT_BURST = 10
+MAX_CONCURRENCY = 8
+MAX_RETRIES = 5
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+RETRY_AFTER_JITTER = 0.5  # Seconds added at random on top of a server's Retry-After
+
+RETRYABLE_EXCEPTIONS = (
+    prawcore.exceptions.TooManyRequests,
+    prawcore.exceptions.ServerError,
+    prawcore.exceptions.RequestException,
+)
+
+
+class TokenBucket:
+    """Thread-safe token bucket. Tokens refill continuously at `rate` per second up to `capacity`."""
+
+    def __init__(self, rate=DEFAULT_RATE, capacity=DEFAULT_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, deadline=None):
+        """Blocks until a token is available. Returns False if the deadline passes first."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate if self.rate > 0 else BASE_BACKOFF
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def set_rate(self, rate, tokens=None):
+        with self.lock:
+            self._refill()
+            self.rate = max(rate, 0.01)
+            if tokens is not None:
+                self.tokens = min(self.tokens, tokens)
+
+    def drain(self, seconds):
+        """Empties the bucket so no request is made for roughly `seconds`."""
+        with self.lock:
+            self._refill()
+            self.tokens = -seconds * self.rate
+
+
+class RedditRequestScheduler:
+    """Wraps PRAW calls with a shared token bucket, adaptive concurrency and jittered backoff.
+
+    Concurrency follows additive-increase / multiplicative-decrease: every successful call
+    nudges the limit up, every 429 halves it.
+
+    PRAW clients are not thread-safe, so calls passing the same `reddit` client run one at a
+    time; calls on different clients (one per Streamlit session or batch worker) run concurrently.
+    """
+
+    def __init__(self, bucket=None, max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES):
+        self.bucket = bucket or TokenBucket()
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.cond = threading.Condition()
+        self.client_locks = weakref.WeakKeyDictionary()  # PRAW client -> lock serialising its requests
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0}
+
+    def _client_lock(self, reddit):
+        with self.cond:
+            lock = self.client_locks.get(reddit)
+            if lock is None:
+                lock = self.client_locks[reddit] = threading.Lock()
+            return lock
+
+    def _enter(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def _exit(self, throttled):
+        with self.cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / max(self.limit, 1))
+            self.cond.notify_all()
+
+    def update_from_headers(self, headers):
+        """Adjusts the bucket from Reddit's `x-ratelimit-*` response headers."""
+        try:
+            remaining = float(headers.get("x-ratelimit-remaining"))
+            reset = float(headers.get("x-ratelimit-reset"))
+        except (TypeError, ValueError):
+            return
+        self._apply_limits(remaining, reset)
+
+    def update_from_reddit(self, reddit):
+        """Adjusts the bucket from the limits PRAW parsed out of the last response."""
+        limits = getattr(getattr(reddit, "auth", None), "limits", None) or {}
+        remaining = limits.get("remaining")
+        reset_timestamp = limits.get("reset_timestamp")
+        if remaining is None or reset_timestamp is None:
+            return
+        self._apply_limits(float(remaining), reset_timestamp - time.time())
+
+    def _apply_limits(self, remaining, reset):
+        if reset <= 0:
+            return
+        if remaining < 1:
+            self.bucket.drain(reset)
+        else:
+            self.bucket.set_rate(remaining / reset, tokens=remaining)
+
+    def _backoff(self, attempt, exc):
+        retry_after = None
+        response = getattr(exc, "response", None)
+        if response is not None:
+            self.update_from_headers(response.headers)
+            retry_after = response.headers.get("retry-after")
+        try:
+            # The server says when it will accept requests again: never earlier, jitter goes on top
+            return float(retry_after) + random.uniform(0, RETRY_AFTER_JITTER)
+        except (TypeError, ValueError):
+            delay = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt)
+        # Full jitter so concurrent sessions don't retry in lockstep
+        return random.uniform(delay / 2, delay)
+
+    def call(self, func, *args, reddit=None, deadline=None, **kwargs):
+        """Runs `func(*args, **kwargs)` under the rate limit, retrying throttled and transient failures.
+
+        Pass the PRAW client `func` uses as `reddit` so its rate-limit state is read back and
+        concurrent calls on it are serialised.
+        """
+        client_lock = self._client_lock(reddit) if reddit is not None else threading.Lock()
+        for attempt in range(self.max_retries + 1):
+            if not self.bucket.acquire(deadline):
+                raise TimeoutError("Rate limit budget exhausted before deadline.")
+            self._enter()
+            throttled = False
+            try:
+                self.stats["calls"] += 1
+                with client_lock:
+                    result = func(*args, **kwargs)
+                    if reddit is not None:
+                        self.update_from_reddit(reddit)
+                return result
+            except RETRYABLE_EXCEPTIONS as e:
+                throttled = isinstance(e, prawcore.exceptions.TooManyRequests)
+                if throttled:
+                    self.stats["throttled"] += 1
+                if attempt == self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                delay = self._backoff(attempt, e)
+            finally:
+                self._exit(throttled)
+            if deadline is not None and time.monotonic() + delay > deadline:
+                self.stats["failures"] += 1
+                raise TimeoutError("Rate limit budget exhausted before deadline.")
+            self.stats["retries"] += 1
+            print(f"Reddit request failed, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+            time.sleep(delay)
+
+    def iterate(self, iterable, reddit=None, deadline=None):
+        """Yields from a lazy PRAW listing, charging the rate limit once per page fetched rather than per item.
+
+        A `ListingGenerator` requests up to 100 items at a time in `_next_batch`, so only that call goes
+        through `call`; items already in memory are yielded without taking a token. Other iterables
+        are advanced item by item through `call`.
+        """
+        fetch_page = getattr(iterable, "_next_batch", None)
+        if fetch_page is None:
+            iterator = iter(iterable)
+            sentinel = object()
+            while True:
+                item = self.call(next, iterator, sentinel, reddit=reddit, deadline=deadline)
+                if item is sentinel:
+                    return
+                yield item
+
+        def next_batch():
+            if getattr(iterable, "_exhausted", False):
+                raise StopIteration()  # Last page already read, no request needed
+            return self.call(fetch_page, reddit=reddit, deadline=deadline)
+
+        iterable._next_batch = next_batch
+        yield from iterable
+
+
+# One scheduler per process so concurrent Streamlit sessions share the same quota
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RedditRequestScheduler()
+        return _scheduler
@@ -4,6 +4,7 @@ import pandas as pd
 import numpy as np
 import streamlit as st
 import matplotlib.patches as mpatches
+from results import sentiment_labels, aspect_scores_long
 
 
 TECH_CATEGORIES = {
@@ -65,20 +66,11 @@ def get_colour(value):
         return 'firebrick' 
     
 def display_sentiment_distribution(df_sentiment):
-    # Make a safe copy 
-    df = df_sentiment.copy()
-
-    # Create a new column with sentiment labels
-    df['Sentiment Label'] = df['Sentiment Score'].apply(map_sentiment_to_label)
-
-    # Define the desired order of sentiment labels
-    sentiment_order = ["Very Negative", "Negative", "Neutral", "Positive", "Very Positive"]
-
-    # Convert 'Sentiment Label' to categorical with the specified order
-    df['Sentiment Label'] = pd.Categorical(df['Sentiment Label'], categories=sentiment_order, ordered=True)
+    # Label the scores without copying the frame (ordered categorical, so counts follow the sentiment order)
+    sentiment_labels_series = sentiment_labels(df_sentiment['Sentiment Score'])
 
     # Count the labels (the order will now be based on the categorical type)
-    sentiment_counts = df['Sentiment Label'].value_counts().sort_index()
+    sentiment_counts = sentiment_labels_series.value_counts().sort_index()
 
     # Plot
     fig, ax = plt.subplots()
@@ -92,6 +84,45 @@ def display_sentiment_distribution(df_sentiment):
 
     st.pyplot(fig)
 
+def display_confidence_intervals(df):
+    """Shows the confidence intervals achieved by an adaptive (early-stopping) analysis, if any."""
+    intervals = df.attrs.get("confidence_intervals")
+    if not intervals:
+        return
+
+    confidence = df.attrs.get("confidence", 0.95)
+    st.subheader(f"Estimate Precision ({confidence:.0%} confidence intervals)")
+    st.caption(f"Sampling stopped: {df.attrs.get('stop_reason', 'unknown')}.")
+    df_intervals = pd.DataFrame([
+        {"Aspect": name, "Mean": ci["mean"], "Lower": ci["low"], "Upper": ci["high"],
+         "± Margin": (ci["high"] - ci["low"]) / 2, "Mentions": ci["n"]}
+        for name, ci in intervals.items()
+    ])
+    st.dataframe(
+        df_intervals.style.format({"Mean": "{:.2f}", "Lower": "{:.2f}", "Upper": "{:.2f}", "± Margin": "{:.3f}"}),
+        use_container_width=True,
+        hide_index=True
+    )
+
+def display_crawl_coverage(df):
+    """Shows how much of each comment tree a deep-crawl analysis covered, if any."""
+    coverage = df.attrs.get("crawl_coverage")
+    if not coverage:
+        return
+
+    df_coverage = pd.DataFrame(coverage)
+    loaded, total = df_coverage["comments_loaded"].sum(), df_coverage["comments_total"].sum()
+    st.subheader("Deep Crawl Coverage")
+    st.caption(f"Loaded {loaded} of {total} comments ({loaded / max(total, 1):.0%}) across {len(df_coverage)} threads "
+               f"using {df_coverage['api_calls'].sum()} API calls.")
+    with st.expander("🌳 View coverage per thread"):
+        st.dataframe(
+            df_coverage[["title", "comments_loaded", "comments_total", "coverage", "max_depth", "api_calls", "unexpanded_stubs"]],
+            use_container_width=True,
+            hide_index=True,
+            column_config={"coverage": st.column_config.ProgressColumn("coverage", min_value=0.0, max_value=1.0, format="%.2f")}
+        )
+
 def plot_aspect_radar_chart(df, keyword, subreddit=None):
     # Select columns that are aspect sentiment scores 
     aspect_columns = df.columns[3:]
@@ -186,18 +217,14 @@ def display_aspect_contribution_to_sentiment(aspects):
         st.info("Run analysis first to see aspect contributions.")
         return
 
-    df = st.session_state['df_comments'].copy()
-    df['Overall Sentiment Label'] = df['Sentiment Score'].apply(map_sentiment_to_label)
+    df = st.session_state['df_comments']
+    overall_labels = sentiment_labels(df['Sentiment Score'])
 
-    sentiment_aspect_counts = df.melt(
-        id_vars='Overall Sentiment Label',
-        value_vars=aspects,
-        var_name='Aspect',
-        value_name='Aspect Score'
-    ).dropna(subset=['Aspect Score'])
-    sentiment_aspect_counts['Aspect Sentiment Label'] = sentiment_aspect_counts['Aspect Score'].apply(map_sentiment_to_label)
+    # Long format (comment_id, aspect, score) read straight from the sparse aspect columns
+    sentiment_aspect_counts = aspect_scores_long(df, list(aspects))
+    sentiment_aspect_counts['Overall Sentiment Label'] = overall_labels.array[sentiment_aspect_counts['comment_id'].to_numpy()]
 
-    grouped_counts = sentiment_aspect_counts.groupby(['Overall Sentiment Label', 'Aspect']).size().unstack(fill_value=0)
+    grouped_counts = sentiment_aspect_counts.groupby(['Overall Sentiment Label', 'aspect'], observed=True).size().unstack(fill_value=0)
 
     sentiment_order_dropdown = ["Very Positive", "Positive", "Neutral", "Negative", "Very Negative"]
     available_sentiments = [s for s in sentiment_order_dropdown if s in grouped_counts.index]
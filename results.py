@@ -0,0 +1,137 @@
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+SENTIMENT_ORDER = ["Very Negative", "Negative", "Neutral", "Positive", "Very Positive"]
+SENTIMENT_BINS = [-np.inf, 0.2, 0.4, 0.6, 0.8, np.inf]
+
+# Most comments mention only one or two aspects, so aspect columns are stored sparse
+ASPECT_DTYPE = pd.SparseDtype("float32", np.nan)
+SCORE_DTYPE = "float32"
+# Comment text in one contiguous Arrow buffer instead of one Python str object per row
+TEXT_DTYPE = "string[pyarrow]"
+
+# Download label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Feather": ("feather", "application/vnd.apache.arrow.file"),
+    "CSV": ("csv", "text/csv"),
+}
+
+
+def compact_sentiment_frame(df, aspects):
+    """Converts a wide sentiment frame to float32 scores, sparse float32 aspect columns and Arrow-backed text.
+
+    The column layout is unchanged, so code that reads the wide frame keeps working.
+    """
+    dtypes = {"Sentiment Score": SCORE_DTYPE}
+    if "Cleaned Comment" in df.columns:
+        dtypes["Cleaned Comment"] = TEXT_DTYPE
+    dtypes.update({aspect: ASPECT_DTYPE for aspect in aspects if aspect in df.columns})
+    compact = df.astype(dtypes, copy=False)
+    compact.attrs = dict(df.attrs)
+    return compact
+
+
+def sentiment_labels(scores):
+    """Maps scores to ordered categorical labels, matching `report.map_sentiment_to_label`."""
+    return pd.cut(scores, bins=SENTIMENT_BINS, labels=SENTIMENT_ORDER, right=False)
+
+
+def aspect_scores_long(df, aspects):
+    """Returns the aspect scores in long format: one (comment_id, aspect, score) row per mention.
+
+    Reads the stored values of sparse columns directly instead of densifying them.
+    """
+    comment_ids, aspect_codes, scores = [], [], []
+    aspects = [aspect for aspect in aspects if aspect in df.columns]
+    for code, aspect in enumerate(aspects):
+        values = df[aspect].array
+        if isinstance(values, pd.arrays.SparseArray):
+            positions = values.sp_index.indices
+            column_scores = values.sp_values
+            mask = ~np.isnan(column_scores)
+            positions, column_scores = positions[mask], column_scores[mask]
+        else:
+            column = np.asarray(values, dtype=SCORE_DTYPE)
+            positions = np.flatnonzero(~np.isnan(column))
+            column_scores = column[positions]
+        comment_ids.append(positions)
+        aspect_codes.append(np.full(len(positions), code, dtype=np.int8))
+        scores.append(column_scores.astype(SCORE_DTYPE, copy=False))
+
+    if not aspects:
+        return pd.DataFrame({"comment_id": [], "aspect": [], "score": []})
+
+    return pd.DataFrame({
+        "comment_id": np.concatenate(comment_ids),
+        "aspect": pd.Categorical.from_codes(np.concatenate(aspect_codes), categories=aspects),
+        "score": np.concatenate(scores),
+    })
+
+
+def to_dense_frame(df):
+    """Densifies sparse columns for consumers (`st.dataframe`, Parquet) that cannot handle sparse dtypes."""
+    sparse_columns = [col for col in df.columns if isinstance(df[col].dtype, pd.SparseDtype)]
+    if not sparse_columns:
+        return df
+    return df.astype({col: df[col].dtype.subtype for col in sparse_columns})
+
+
+def to_arrow_table(df):
+    """Converts a result frame to an Arrow table. Numeric columns are handed over as buffers, not Python objects.
+
+    Sparse columns are densified one at a time rather than copying the whole frame first.
+    """
+    arrays = {}
+    for column in df.columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.SparseDtype):
+            values = values.sparse.to_dense()
+        arrays[column] = pa.Array.from_pandas(values)
+    return pa.table(arrays)
+
+
+def write_table(table, sink, fmt):
+    """Serialises an Arrow table to `sink` (an Arrow stream or a binary file object) in one of EXPORT_FORMATS."""
+    if fmt == "Parquet":
+        pq.write_table(table, sink, compression="zstd")
+    elif fmt == "Feather":
+        feather.write_feather(table, sink, compression="zstd")
+    elif fmt == "CSV":
+        pa_csv.write_csv(table, sink)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+
+def export_table(table, fmt):
+    """Serialises an Arrow table straight into an Arrow buffer in one of EXPORT_FORMATS."""
+    sink = pa.BufferOutputStream()
+    write_table(table, sink, fmt)
+    return sink.getvalue()
+
+
+def export_file(df, fmt):
+    """Writes a result frame in one of EXPORT_FORMATS to an anonymous temporary file and returns it rewound.
+
+    The serialised file lives on disk instead of in memory next to the frame; Streamlit reads it
+    once when serving a deferred download and the file disappears when closed.
+    """
+    file = tempfile.TemporaryFile(buffering=0)
+    write_table(to_arrow_table(df), file, fmt)
+    file.seek(0)
+    return file
+
+
+def to_parquet_bytes(df):
+    return export_table(to_arrow_table(df), "Parquet").to_pybytes()
+
+
+def read_parquet_bytes(data):
+    """Loads Parquet bytes into an Arrow-backed DataFrame without converting columns to NumPy/Python objects."""
+    return pq.read_table(pa.BufferReader(data)).to_pandas(types_mapper=pd.ArrowDtype)
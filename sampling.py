@@ -0,0 +1,98 @@
+import math
+import time
+
+Z_SCORES = {0.90: 1.645, 0.95: 1.96, 0.99: 2.576}
+MIN_SAMPLES = 30  # Normal-approximation intervals are unreliable below this
+
+
+class RunningStats:
+    """Running mean and variance (Welford's algorithm), so no scores need to be kept around."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def half_width(self, z):
+        if self.n < 2:
+            return math.inf
+        return z * math.sqrt(self.m2 / (self.n - 1) / self.n)
+
+
+class ConvergenceMonitor:
+    """Tracks confidence intervals for the overall and per-aspect mean sentiment as scores stream in.
+
+    Converged means the overall interval half-width is at most `precision` and, if
+    `aspect_precision` is set, so is the half-width of every aspect with at least
+    `min_samples` mentions.
+    """
+
+    def __init__(self, aspects, precision=0.02, aspect_precision=None, confidence=0.95, min_samples=MIN_SAMPLES):
+        self.aspects = list(aspects)
+        self.precision = precision
+        self.aspect_precision = aspect_precision
+        self.confidence = confidence
+        self.z = Z_SCORES.get(confidence, 1.96)
+        self.min_samples = min_samples
+        self.overall = RunningStats()
+        self.aspect_stats = {aspect: RunningStats() for aspect in self.aspects}
+
+    def update_frame(self, df):
+        """Adds the scores of a frame produced by `analyze_comments`."""
+        if df.empty:
+            return
+        for score in df["Sentiment Score"].dropna():
+            self.overall.update(float(score))
+        for aspect in self.aspects:
+            if aspect in df.columns:
+                for score in df[aspect].dropna():
+                    self.aspect_stats[aspect].update(float(score))
+
+    def converged(self):
+        if self.overall.n < self.min_samples or self.overall.half_width(self.z) > self.precision:
+            return False
+        if self.aspect_precision is None:
+            return True
+        return all(
+            stats.half_width(self.z) <= self.aspect_precision
+            for stats in self.aspect_stats.values() if stats.n >= self.min_samples
+        )
+
+    def intervals(self):
+        """Returns {name: {"mean", "low", "high", "n"}} for the overall score and every mentioned aspect."""
+        intervals = {}
+        for name, stats in [("Overall", self.overall)] + list(self.aspect_stats.items()):
+            if stats.n == 0:
+                continue
+            half_width = stats.half_width(self.z)
+            intervals[name] = {
+                "mean": stats.mean,
+                "low": max(0.0, stats.mean - half_width),
+                "high": min(1.0, stats.mean + half_width),
+                "n": stats.n,
+            }
+        return intervals
+
+
+class SamplingBudget:
+    """Hard caps on an adaptive run: a wall-clock limit and/or a maximum number of scored comments."""
+
+    def __init__(self, max_seconds=None, max_comments=None):
+        self.max_seconds = max_seconds
+        self.max_comments = max_comments
+        self.started = time.monotonic()
+        # Passed to the request scheduler so no Reddit request waits past the time limit
+        self.deadline = self.started + max_seconds if max_seconds is not None else None
+
+    def exhausted(self, comments_scored):
+        if self.max_comments is not None and comments_scored >= self.max_comments:
+            return "comment budget reached"
+        if self.max_seconds is not None and time.monotonic() - self.started >= self.max_seconds:
+            return "time budget reached"
+        return None
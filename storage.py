@@ -0,0 +1,89 @@
+import os
+import sys
+
+import firebase_admin
+from firebase_admin import credentials, auth, firestore
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore as cloud_firestore
+import streamlit as st
+
+DEFAULT_EMULATOR_PROJECT = "demo-reddit-sentiment"
+
+
+def _firebase_backend():
+    # --- Initialize Firebase Admin SDK using Streamlit secrets ---
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        # Make a copy so we can edit the private_key
+        cred_dict = dict(st.secrets["firebase"])
+        cred_dict["private_key"] = cred_dict["private_key"].replace("\\n", "\n")
+        cred = credentials.Certificate(cred_dict)
+        firebase_admin.initialize_app(cred)
+
+    print("Firebase initialized")
+    return firestore.client(), auth
+
+
+def _emulator_backend(config):
+    """Firestore and Auth emulators from the Firebase Local Emulator Suite; no credentials needed."""
+    os.environ["FIRESTORE_EMULATOR_HOST"] = config.get("firestore_host", "localhost:8080")
+    os.environ["FIREBASE_AUTH_EMULATOR_HOST"] = config.get("auth_host", "localhost:9099")
+    project_id = config.get("project_id", DEFAULT_EMULATOR_PROJECT)
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        # The auth module switches to emulator credentials itself; it only needs the project id
+        firebase_admin.initialize_app(options={"projectId": project_id})
+
+    # firestore.client() would look up Application Default Credentials, which the emulator doesn't need
+    print(f"Using Firestore emulator at {os.environ['FIRESTORE_EMULATOR_HOST']}")
+    return cloud_firestore.Client(project=project_id, credentials=AnonymousCredentials()), auth
+
+
+def _memory_backend():
+    from fakefirestore import FakeFirestore, FakeAuth
+    print("Using in-memory Firestore")
+    return FakeFirestore(), FakeAuth()
+
+
+def get_backend(config=None):
+    """Returns (Firestore client, Auth module) for the backend chosen by `[firestore] backend` in secrets.
+
+    "firebase" (default) uses the real project, "emulator" the local Firebase emulators
+    (`firestore_host`, `auth_host`, `project_id` options), and "memory" an in-process fake
+    for tests and benchmarks. `config` overrides the `[firestore]` secrets section.
+    """
+    if config is None:
+        config = dict(st.secrets["firestore"]) if "firestore" in st.secrets else {}
+    backend = config.get("backend", "firebase")
+    if backend == "memory":
+        return _memory_backend()
+    if backend == "emulator":
+        return _emulator_backend(config)
+    if backend != "firebase":
+        raise ValueError(f"Unknown Firestore backend: {backend}")
+    return _firebase_backend()
+
+
+def check_offline_backends():
+    """Builds the emulator and in-memory backends without network access or credentials."""
+    db, emulator_auth = get_backend({"backend": "emulator"})
+    assert isinstance(db, cloud_firestore.Client), f"unexpected client {type(db)}"
+    assert db.collection("users").document("check").path == "users/check"
+    assert emulator_auth.Client(firebase_admin.get_app()) is not None
+    print("✅ emulator backend builds without credentials")
+
+    db, memory_auth = get_backend({"backend": "memory"})
+    db.collection("users").document("check").set({"username": "check"})
+    assert db.collection("users").where("username", "==", "check").get()[0].id == "check"
+    assert memory_auth.get_user(memory_auth.create_user(email="check@example.com", password="check").uid)
+    print("✅ memory backend round-trips a user")
+
+
+if __name__ == "__main__":
+    try:
+        check_offline_backends()
+    except Exception as e:
+        print(f"❌ {type(e).__name__}: {e}")
+        sys.exit(1)
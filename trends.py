@@ -0,0 +1,181 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from distilbert import PREDEFINED_ASPECTS
+from results import aspect_scores_long
+
+DEFAULT_TRENDS_PATH = os.path.join("data", "sentiment_trends.sqlite")
+GRANULARITIES = {"hour": 60 * 60, "day": 24 * 60 * 60}
+OVERALL = "Overall"
+# Comments are deduplicated by key only within this window of their timestamp. Older comments are left
+# out of the trends, so seen keys can be evicted once they fall outside it without anything being double-counted.
+SEEN_HORIZON = 90 * 24 * 60 * 60
+COMPACT_INTERVAL = 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    keyword TEXT NOT NULL,
+    aspect TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    bucket_start INTEGER NOT NULL,
+    score_sum REAL NOT NULL,
+    score_sumsq REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (keyword, granularity, aspect, bucket_start)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS seen_comments (
+    keyword TEXT NOT NULL,
+    comment_key INTEGER NOT NULL,
+    comment_time INTEGER NOT NULL,
+    PRIMARY KEY (keyword, comment_key)
+) WITHOUT ROWID;
+"""
+
+SEEN_INDEX = "CREATE INDEX IF NOT EXISTS idx_seen_comments_time ON seen_comments (comment_time)"
+
+UPSERT = """
+INSERT INTO buckets (keyword, aspect, granularity, bucket_start, score_sum, score_sumsq, count)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (keyword, granularity, aspect, bucket_start) DO UPDATE SET
+    score_sum = score_sum + excluded.score_sum,
+    score_sumsq = score_sumsq + excluded.score_sumsq,
+    count = count + excluded.count
+"""
+
+
+def normalise_keyword(keyword):
+    return " ".join(keyword.lower().split())
+
+
+def comment_key(timestamp, text):
+    """Stable 64-bit key for a scored comment, used to avoid counting it twice across runs."""
+    digest = hashlib.blake2b(f"{timestamp}|{text}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class TrendStore:
+    """Hourly and daily running sums/counts of sentiment per (keyword, aspect).
+
+    Scored comments are folded in incrementally, so trend charts read a few hundred
+    bucket rows instead of every historical comment.
+    """
+
+    def __init__(self, path=DEFAULT_TRENDS_PATH, seen_horizon=SEEN_HORIZON):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(seen_comments)")]
+        if "comment_time" not in columns:
+            # Stores created before eviction: keep their keys for one more horizon from now
+            with self.conn:
+                self.conn.execute("ALTER TABLE seen_comments ADD COLUMN comment_time INTEGER NOT NULL DEFAULT 0")
+                self.conn.execute("UPDATE seen_comments SET comment_time = ?", (int(time.time()),))
+        self.conn.execute(SEEN_INDEX)
+        self.seen_horizon = seen_horizon
+        self.last_compacted = 0
+
+    def add_frame(self, keyword, df):
+        """Adds the comments of a result frame that were not added for this keyword before. Returns how many were new.
+
+        Comments older than the seen horizon are skipped, since they can no longer be deduplicated.
+        """
+        if df.empty:
+            return 0
+        self.maybe_compact()
+        keyword = normalise_keyword(keyword)
+        comment_times = pd.to_datetime(df["Timestamp"]).to_numpy().astype("datetime64[s]").astype(np.int64)
+        cutoff = time.time() - self.seen_horizon
+
+        with self.lock, self.conn:
+            is_new = np.array([
+                comment_time >= cutoff and self.conn.execute(
+                    "INSERT OR IGNORE INTO seen_comments (keyword, comment_key, comment_time) VALUES (?, ?, ?)",
+                    (keyword, comment_key(ts, text), int(comment_time))
+                ).rowcount == 1
+                for ts, text, comment_time in zip(df["Timestamp"], df["Cleaned Comment"], comment_times)
+            ], dtype=bool)
+            if not is_new.any():
+                return 0
+
+            df_new = df[is_new].reset_index(drop=True)
+            epoch_seconds = comment_times[is_new]
+            scores = aspect_scores_long(df_new, list(PREDEFINED_ASPECTS))
+            scores = pd.concat([
+                pd.DataFrame({"comment_id": np.arange(len(df_new)), "aspect": OVERALL,
+                              "score": df_new["Sentiment Score"].to_numpy(dtype=np.float64)}),
+                pd.DataFrame({"comment_id": scores["comment_id"], "aspect": scores["aspect"].astype(str),
+                              "score": scores["score"].astype(np.float64)}),
+            ], ignore_index=True).dropna(subset=["score"])
+            scores["sumsq"] = scores["score"] ** 2
+
+            for granularity, seconds in GRANULARITIES.items():
+                scores["bucket_start"] = epoch_seconds[scores["comment_id"].to_numpy()] // seconds * seconds
+                grouped = scores.groupby(["aspect", "bucket_start"]).agg(
+                    score_sum=("score", "sum"), score_sumsq=("sumsq", "sum"), count=("score", "size")
+                ).reset_index()
+                self.conn.executemany(UPSERT, [
+                    (keyword, row.aspect, granularity, int(row.bucket_start), float(row.score_sum), float(row.score_sumsq), int(row.count))
+                    for row in grouped.itertuples(index=False)
+                ])
+        return int(is_new.sum())
+
+    def compact(self):
+        """Evicts seen keys of comments older than the seen horizon. Returns how many were removed."""
+        cutoff = int(time.time() - self.seen_horizon)
+        with self.lock, self.conn:
+            removed = self.conn.execute("DELETE FROM seen_comments WHERE comment_time < ?", (cutoff,)).rowcount
+        self.last_compacted = time.time()
+        return removed
+
+    def maybe_compact(self):
+        if time.time() - self.last_compacted >= COMPACT_INTERVAL:
+            self.compact()
+
+    def trend(self, keyword, granularity="day", aspects=None, start=None, end=None):
+        """Returns a frame of (Bucket, Aspect, Mean, Count, Std) rows for plotting, oldest bucket first."""
+        query = "SELECT bucket_start, aspect, score_sum, score_sumsq, count FROM buckets WHERE keyword = ? AND granularity = ?"
+        params = [normalise_keyword(keyword), granularity]
+        if aspects:
+            query += f" AND aspect IN ({', '.join('?' * len(aspects))})"
+            params.extend(aspects)
+        if start is not None:
+            query += " AND bucket_start >= ?"
+            params.append(int(pd.Timestamp(start).timestamp()))
+        if end is not None:
+            query += " AND bucket_start < ?"
+            params.append(int(pd.Timestamp(end).timestamp()))
+        query += " ORDER BY bucket_start"
+
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        df = pd.DataFrame(rows, columns=["bucket_start", "Aspect", "score_sum", "score_sumsq", "Count"])
+        df["Bucket"] = pd.to_datetime(df["bucket_start"], unit="s")
+        df["Mean"] = df["score_sum"] / df["Count"]
+        df["Std"] = np.sqrt(np.maximum(df["score_sumsq"] / df["Count"] - df["Mean"] ** 2, 0))
+        return df[["Bucket", "Aspect", "Mean", "Count", "Std"]]
+
+    def keywords(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT DISTINCT keyword FROM buckets ORDER BY keyword")]
+
+
+_trend_store = None
+_trend_store_lock = threading.Lock()
+
+
+def get_trend_store():
+    """Returns the process-wide trend store."""
+    global _trend_store
+    with _trend_store_lock:
+        if _trend_store is None:
+            _trend_store = TrendStore()
+        return _trend_store